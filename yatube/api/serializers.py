@@ -0,0 +1,83 @@
+"""Поля ответов API: публичное имя -> выражение для values().
+
+Ответы собираются прямо из словарей values(), без моделей; ?fields=
+сужает выборку до нужных столбцов.
+"""
+from django.conf import settings
+
+POST_FIELDS = {
+    "id": "pk",
+    "text": "text",
+    "pub_date": "pub_date",
+    "author": "author__username",
+    "group": "group__slug",
+    "image": "image",
+    "comment_count": "comment_count",
+}
+GROUP_FIELDS = {
+    "id": "pk",
+    "title": "title",
+    "slug": "slug",
+    "description": "description",
+}
+PROFILE_FIELDS = {
+    "id": "pk",
+    "username": "username",
+    "first_name": "first_name",
+    "last_name": "last_name",
+    "posts_count": "stats__posts_count",
+    "followers_count": "stats__followers_count",
+    "following_count": "stats__following_count",
+}
+COMMENT_FIELDS = {
+    "id": "pk",
+    "post": "post_id",
+    "author": "author__username",
+    "text": "text",
+    "created": "created",
+}
+
+
+def _media_url(name):
+    return f"{settings.MEDIA_URL}{name}" if name else None
+
+
+# Преобразования значений, которые нельзя отдать как есть.
+CONVERTERS = {
+    "image": _media_url,
+}
+
+
+class BadRequest(Exception):
+    """Неверные параметры запроса; текст уходит клиенту с кодом 400."""
+
+
+def select(available, requested):
+    """Поля из ?fields= в порядке available; пустой запрос - все поля."""
+    names = {
+        name.strip() for name in (requested or "").split(",") if name.strip()
+    }
+    # "?fields=," тоже пустой запрос, а не ответ из пустых объектов.
+    if not names:
+        return dict(available)
+    unknown = names - set(available)
+    if unknown:
+        raise BadRequest(f"Неизвестные поля: {', '.join(sorted(unknown))}")
+    return {
+        name: lookup for name, lookup in available.items() if name in names
+    }
+
+
+def lookups(fields, *extra):
+    """Аргументы values(): выбранные поля и поля ключа курсора."""
+    return list(dict.fromkeys([*fields.values(), *extra]))
+
+
+def serialize(row, fields):
+    """Словарь ответа из строки values()."""
+    result = {}
+    for name, lookup in fields.items():
+        value = row[lookup]
+        converter = CONVERTERS.get(name)
+        result[name] = converter(value) if converter else value
+    return result
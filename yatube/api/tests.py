@@ -0,0 +1,96 @@
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ApiTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username="author", first_name="Лев")
+        cls.reader = User.objects.create_user(username="reader")
+        cls.group = Group.objects.create(
+            title="Группа", slug="group", description="Описание")
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, text=f"Пост {i}",
+                group=cls.group if i % 2 else None)
+            for i in range(5)
+        ]
+        Comment.objects.create(
+            post=cls.posts[0], author=cls.reader, text="Комментарий")
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def get(self, name, *args, **params):
+        return self.client.get(reverse(f"api:v1:{name}", args=args), params)
+
+    def test_posts_cursor_and_fields(self):
+        """Страницы по курсору и только запрошенные поля."""
+        first = self.get("posts", limit=3, fields="id,author").json()
+        self.assertEqual(
+            first["results"],
+            [{"id": post.pk, "author": "author"}
+             for post in reversed(self.posts[2:])])
+        second = self.get("posts", limit=3, cursor=first["next"]).json()
+        self.assertEqual(
+            [row["id"] for row in second["results"]],
+            [self.posts[1].pk, self.posts[0].pk])
+        self.assertIsNone(second["next"])
+        self.assertEqual(second["results"][0]["group"], "group")
+
+    def test_ids_lookup(self):
+        ids = f"{self.posts[3].pk},999,{self.posts[1].pk}"
+        with self.assertNumQueries(1):
+            response = self.get("posts", ids=ids, fields="id")
+        self.assertEqual(
+            response.json()["results"],
+            [{"id": self.posts[3].pk}, {"id": self.posts[1].pk}])
+
+    def test_details(self):
+        profile = self.get("profile", "author").json()
+        self.assertEqual(profile["posts_count"], 5)
+        self.assertEqual(profile["first_name"], "Лев")
+        group = self.get("group", "group", fields="title").json()
+        self.assertEqual(group, {"title": "Группа"})
+        comments = self.get("post_comments", self.posts[0].pk).json()
+        self.assertEqual(comments["results"][0]["author"], "reader")
+        post = self.get("post", self.posts[0].pk).json()
+        self.assertEqual(post["text"], "Пост 0")
+        self.assertIsNone(post["image"])
+
+    def test_empty_fields_mean_all(self):
+        for fields in ("", ",", " , "):
+            with self.subTest(fields=fields):
+                post = self.get("posts", fields=fields).json()["results"][0]
+                self.assertIn("text", post)
+
+    def test_errors(self):
+        response = self.get("posts", fields="id,password")
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertIn("password", response.json()["error"])
+        response = self.get("posts", ids="1,x")
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        response = self.get("profile", "nobody")
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        self.assertEqual(self.get("follow").status_code,
+                         HTTPStatus.UNAUTHORIZED)
+
+    def test_etag(self):
+        response = self.get("groups")
+        repeated = self.client.get(
+            reverse("api:v1:groups"), HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(repeated.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_follow_feed(self):
+        self.client.force_login(self.reader)
+        feed = self.get("follow", limit=2, fields="id").json()
+        self.assertEqual(
+            feed["results"],
+            [{"id": self.posts[4].pk}, {"id": self.posts[3].pk}])
+        self.assertIsNotNone(feed["next"])
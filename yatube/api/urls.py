@@ -0,0 +1,23 @@
+from django.urls import include, path
+from . import views
+
+app_name = "api"
+
+v1_patterns = [
+    path("posts/", views.posts, name="posts"),
+    path("posts/<int:post_id>/", views.post, name="post"),
+    path(
+        "posts/<int:post_id>/comments/",
+        views.post_comments,
+        name="post_comments"
+    ),
+    path("groups/", views.groups, name="groups"),
+    path("groups/<slug:slug>/", views.group, name="group"),
+    path("profiles/", views.profiles, name="profiles"),
+    path("profiles/<str:username>/", views.profile, name="profile"),
+    path("follow/", views.follow, name="follow"),
+]
+
+urlpatterns = [
+    path("v1/", include((v1_patterns, "v1"))),
+]
@@ -0,0 +1,175 @@
+import hashlib
+from functools import wraps
+from http import HTTPStatus
+
+from django.http import Http404, JsonResponse
+from django.utils.cache import (
+    get_conditional_response, patch_cache_control, patch_vary_headers,
+    quote_etag,
+)
+from django.views.decorators.http import require_safe
+
+from posts import timeline
+from posts.models import Comment, Group, Post, User
+from posts.paginator import CursorPaginator
+from .serializers import (
+    COMMENT_FIELDS, GROUP_FIELDS, POST_FIELDS, PROFILE_FIELDS, BadRequest,
+    lookups, select, serialize,
+)
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+MAX_IDS = 100
+POST_ORDERING = ("-pub_date", "-pk")
+
+
+def _error(message, status):
+    return JsonResponse({"error": message}, status=status)
+
+
+def api_view(view):
+    """Только чтение, ошибки в JSON и ETag по содержимому ответа."""
+    @require_safe
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            response = view(request, *args, **kwargs)
+        except BadRequest as error:
+            return _error(str(error), HTTPStatus.BAD_REQUEST)
+        except Http404:
+            return _error("Не найдено", HTTPStatus.NOT_FOUND)
+        if response.status_code != HTTPStatus.OK:
+            return response
+        etag = quote_etag(hashlib.md5(response.content).hexdigest())
+        response["ETag"] = etag
+        patch_cache_control(response, no_cache=True)
+        patch_vary_headers(response, ["Cookie"])
+        return get_conditional_response(request, etag=etag, response=response)
+    return wrapper
+
+
+def _fields(request, available):
+    return select(available, request.GET.get("fields"))
+
+
+def _limit(request):
+    try:
+        limit = int(request.GET.get("limit", DEFAULT_LIMIT))
+    except ValueError:
+        raise BadRequest("limit - целое число")
+    return min(max(limit, 1), MAX_LIMIT)
+
+
+def _ids(request):
+    raw = request.GET.get("ids")
+    if raw is None:
+        return None
+    try:
+        ids = [int(pk) for pk in raw.split(",") if pk]
+    except ValueError:
+        raise BadRequest("ids - числа через запятую")
+    if len(ids) > MAX_IDS:
+        raise BadRequest(f"Не больше {MAX_IDS} ids за запрос")
+    return ids
+
+
+def _by_ids(queryset, fields, ids):
+    """Записи по списку pk одним запросом, в порядке списка."""
+    rows = {
+        row["pk"]: row
+        for row in queryset.filter(pk__in=ids).values(
+            *lookups(fields, "pk"))
+    }
+    return [serialize(rows[pk], fields) for pk in ids if pk in rows]
+
+
+def _list(request, queryset, available, ordering):
+    """Список с ?ids= или страницей по курсору."""
+    fields = _fields(request, available)
+    ids = _ids(request)
+    if ids is not None:
+        return JsonResponse({"results": _by_ids(queryset, fields, ids)})
+    key = [field.lstrip("-") for field in ordering]
+    paginator = CursorPaginator(
+        queryset.values(*lookups(fields, *key)), _limit(request),
+        ordering=ordering)
+    page = paginator.get_cursor_page(request.GET.get("cursor"))
+    return JsonResponse({
+        "results": [serialize(row, fields) for row in page.object_list],
+        "next": page.next_cursor,
+        "previous": page.previous_cursor,
+    })
+
+
+def _detail(request, queryset, available):
+    fields = _fields(request, available)
+    row = queryset.values(*lookups(fields)).first()
+    if row is None:
+        raise Http404
+    return JsonResponse(serialize(row, fields))
+
+
+@api_view
+def posts(request):
+    queryset = Post.objects.all()
+    if "group" in request.GET:
+        queryset = queryset.filter(group__slug=request.GET["group"])
+    if "author" in request.GET:
+        queryset = queryset.filter(author__username=request.GET["author"])
+    return _list(request, queryset, POST_FIELDS, POST_ORDERING)
+
+
+@api_view
+def post(request, post_id):
+    return _detail(request, Post.objects.filter(pk=post_id), POST_FIELDS)
+
+
+@api_view
+def post_comments(request, post_id):
+    if not Post.objects.filter(pk=post_id).exists():
+        raise Http404
+    return _list(
+        request, Comment.objects.filter(post_id=post_id), COMMENT_FIELDS,
+        ("created", "pk"))
+
+
+@api_view
+def groups(request):
+    return _list(
+        request, Group.objects.all(), GROUP_FIELDS, ("title", "pk"))
+
+
+@api_view
+def group(request, slug):
+    return _detail(request, Group.objects.filter(slug=slug), GROUP_FIELDS)
+
+
+@api_view
+def profiles(request):
+    return _list(request, User.objects.all(), PROFILE_FIELDS, ("pk",))
+
+
+@api_view
+def profile(request, username):
+    return _detail(
+        request, User.objects.filter(username=username), PROFILE_FIELDS)
+
+
+@api_view
+def follow(request):
+    """Лента подписок пользователя: порядок из ленты, поля из values()."""
+    if not request.user.is_authenticated:
+        return _error("Нужна авторизация", HTTPStatus.UNAUTHORIZED)
+    fields = _fields(request, POST_FIELDS)
+    paginator = timeline.TimelinePaginator(
+        timeline.timeline_posts(request.user).only("pk"), _limit(request),
+        user=request.user)
+    page = paginator.get_cursor_page(request.GET.get("cursor"))
+    ids = [post.pk for post in page.object_list]
+    response = JsonResponse({
+        "results": _by_ids(Post.objects.all(), fields, ids),
+        "next": page.next_cursor,
+        "previous": page.previous_cursor,
+    })
+    patch_cache_control(response, private=True)
+    return response
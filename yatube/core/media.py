@@ -0,0 +1,112 @@
+"""Раздача медиафайлов без чтения файла в память.
+
+Если перед Django стоит nginx или Apache, файл отдает он по заголовку
+X-Accel-Redirect или X-Sendfile (MEDIA_SENDFILE). Иначе ответ несет
+открытый файл, и WSGI-сервер передает его через wsgi.file_wrapper -
+gunicorn и uWSGI отправляют такой файл системным вызовом sendfile.
+"""
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe
+
+# Имя из хеша содержимого (картинки постов) или ключа превью sorl:
+# по такому адресу всегда лежит один и тот же файл.
+HASHED_NAME_RE = re.compile(r"(^|/)[0-9a-f]{32,}\.\w+$")
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+# Размер блока, когда сервер не умеет wsgi.file_wrapper.
+BLOCK_SIZE = 64 * 1024
+
+
+class RangeFile:
+    """Часть открытого файла от start длиной length.
+
+    read() не выходит за конец диапазона, а fileno() вместе с позицией
+    файла позволяет серверу отправить диапазон через sendfile.
+    """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def etag(stat):
+    """ETag из времени изменения и размера, как у nginx."""
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def requested_range(request, size, etag, last_modified):
+    """Запрошенный диапазон (start, length), None для всего файла.
+
+    Поддерживается один диапазон; на несколько отдается весь файл, это
+    допускает RFC 7233. Для недостижимого диапазона - ValueError.
+    """
+    header = request.META.get("HTTP_RANGE")
+    if not header:
+        return None
+    if_range = request.META.get("HTTP_IF_RANGE")
+    if if_range and if_range != etag and (
+            parse_http_date_safe(if_range) != last_modified):
+        return None
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    start, end = match.groups()
+    if not start:
+        if not end:
+            return None
+        # Суффикс: последние end байт.
+        length = min(int(end), size)
+        if not length:
+            raise ValueError(header)
+        return size - length, length
+    start = int(start)
+    if end and int(end) < start:
+        return None
+    if start >= size:
+        raise ValueError(header)
+    end = min(int(end), size - 1) if end else size - 1
+    return start, end - start + 1
+
+
+def sendfile_headers(response, path, full_path):
+    """Передает отдачу файла фронтенду, если он настроен."""
+    if settings.MEDIA_SENDFILE == "x-accel-redirect":
+        response["X-Accel-Redirect"] = quote(
+            settings.MEDIA_ACCEL_PREFIX + path)
+        return True
+    if settings.MEDIA_SENDFILE == "x-sendfile":
+        response["X-Sendfile"] = full_path
+        return True
+    return False
+
+
+def set_headers(response, path, stat):
+    """Заголовки кэширования, общие для полного ответа и 304."""
+    response["ETag"] = etag(stat)
+    response["Last-Modified"] = http_date(stat.st_mtime)
+    response["Accept-Ranges"] = "bytes"
+    if HASHED_NAME_RE.search(path):
+        patch_cache_control(
+            response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(
+            response, public=True, max_age=settings.MEDIA_MAX_AGE)
+    return response
@@ -0,0 +1,46 @@
+"""Простые метрики процесса: счётчики, значения и замеры времени."""
+import threading
+import time
+from contextlib import contextmanager
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+
+
+def incr(name, value=1):
+    """Увеличивает счётчик name на value."""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def gauge(name, value):
+    """Запоминает текущее значение name."""
+    with _lock:
+        _gauges[name] = value
+
+
+@contextmanager
+def timer(name):
+    """Считает вызовы и суммарное время блока в name.count/name.seconds."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with _lock:
+            _counters[f"{name}.count"] = _counters.get(
+                f"{name}.count", 0) + 1
+            _counters[f"{name}.seconds"] = _counters.get(
+                f"{name}.seconds", 0) + elapsed
+
+
+def snapshot():
+    with _lock:
+        return {"counters": dict(_counters), "gauges": dict(_gauges)}
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
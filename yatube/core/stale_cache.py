@@ -0,0 +1,57 @@
+"""Кэш с отдачей устаревшего значения, пока его пересчитывает один воркер.
+
+Запись хранится как (версия, свежо_до, значение) дольше своего срока.
+Когда срок вышел или сменилась версия, значение пересчитывает только
+тот процесс, что первым взял блокировку через атомарный cache.add,
+остальные в это время отдают прежнее значение.
+"""
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import metrics
+
+LOCK_SUFFIX = ":lock"
+
+
+def _release(lock, token):
+    # Блокировка могла истечь и достаться другому воркеру: удаляем
+    # только свою. Проверка и удаление не атомарны, но окно гонки -
+    # между двумя запросами к кэшу, а не весь срок блокировки.
+    if cache.get(lock) == token:
+        cache.delete(lock)
+
+
+def get_or_build(key, build, timeout, version=None):
+    """Значение key; build() вызывается не более чем одним воркером.
+
+    Если холодный ключ уже строит другой воркер, значение строится и
+    здесь, но в кэш не пишется: ждать чужой результат в запросе дольше.
+    """
+    now = time.time()
+    entry = cache.get(key)
+    if entry is not None:
+        entry_version, fresh_until, value = entry
+        if entry_version == version and now < fresh_until:
+            return value
+    lock = key + LOCK_SUFFIX
+    token = uuid.uuid4().hex
+    if not cache.add(lock, token, settings.STALE_CACHE_LOCK_TIMEOUT):
+        if entry is not None:
+            metrics.incr("stale_cache.stale_served")
+            return value
+        metrics.incr("stale_cache.cold_built")
+        return build()
+    try:
+        metrics.incr("stale_cache.rebuild")
+        value = build()
+        cache.set(
+            key,
+            (version, time.time() + timeout, value),
+            timeout + settings.STALE_CACHE_GRACE,
+        )
+    finally:
+        _release(lock, token)
+    return value
@@ -0,0 +1,53 @@
+from django import template
+from django.core.cache.utils import make_template_fragment_key
+
+from core.stale_cache import get_or_build
+
+register = template.Library()
+
+
+class StaleCacheNode(template.Node):
+    def __init__(self, nodelist, expire_time, fragment_name, vary_on,
+                 version):
+        self.nodelist = nodelist
+        self.expire_time = expire_time
+        self.fragment_name = fragment_name
+        self.vary_on = vary_on
+        self.version = version
+
+    def render(self, context):
+        expire_time = int(self.expire_time.resolve(context))
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        version = self.version.resolve(context) if self.version else None
+        return get_or_build(
+            make_template_fragment_key(self.fragment_name, vary_on),
+            lambda: self.nodelist.render(context),
+            expire_time,
+            version,
+        )
+
+
+@register.tag("stale_cache")
+def do_stale_cache(parser, token):
+    """Как {% cache %}, но с общим кэшем и отдачей устаревшей версии.
+
+    {% stale_cache 600 name var1 var2 version=feed_version %}
+    Смена version не меняет ключ: пока один воркер перестраивает
+    фрагмент, остальные отдают прежний.
+    """
+    nodelist = parser.parse(("endstale_cache",))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    if len(tokens) < 3:
+        raise template.TemplateSyntaxError(
+            f"'{tokens[0]}' tag requires at least 2 arguments.")
+    version = None
+    if tokens[-1].startswith("version="):
+        version = parser.compile_filter(tokens.pop()[len("version="):])
+    return StaleCacheNode(
+        nodelist,
+        parser.compile_filter(tokens[1]),
+        tokens[2],
+        [parser.compile_filter(token) for token in tokens[3:]],
+        version,
+    )
@@ -9,3 +9,18 @@ def addclass(field, css):
     с использованием CSS
     """
     return field.as_widget(attrs={'class': css})
+
+
+@register.simple_tag(takes_context=True)
+def url_replace(context, **kwargs):
+    """Текущие GET-параметры страницы с замененными значениями.
+
+    Номер страницы ?page= всегда отбрасывается, листаем курсором.
+    """
+    query = context["request"].GET.copy()
+    query.pop("page", None)
+    for key, value in kwargs.items():
+        query.pop(key, None)
+        if value is not None:
+            query[key] = value
+    return query.urlencode()
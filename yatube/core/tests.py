@@ -1,9 +1,140 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 from http import HTTPStatus
 
+from . import stale_cache
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
 
 class ViewTestClass(TestCase):
     def test_error_page(self):
         response = self.client.get('/nonexist-page/')
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
         self.assertTemplateUsed(response, "core/404.html")
+
+
+class StaleCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_single_rebuild_serves_stale(self):
+        """Пока один воркер держит блокировку, остальные отдают старое."""
+        stale_cache.get_or_build("feed", lambda: "old", 60, version=1)
+        # Другой воркер уже перестраивает фрагмент новой версии.
+        cache.add("feed" + stale_cache.LOCK_SUFFIX, 1)
+        value = stale_cache.get_or_build(
+            "feed", lambda: self.fail("повторный пересчет"), 60, version=2)
+        self.assertEqual(value, "old")
+        cache.delete("feed" + stale_cache.LOCK_SUFFIX)
+        value = stale_cache.get_or_build("feed", lambda: "new", 60, version=2)
+        self.assertEqual(value, "new")
+        self.assertIsNone(cache.get("feed" + stale_cache.LOCK_SUFFIX))
+
+    def test_expired_entry_rebuilt(self):
+        """Истекший фрагмент пересчитывается, свежий берется из кэша."""
+        stale_cache.get_or_build("feed", lambda: "old", 0)
+        self.assertEqual(
+            stale_cache.get_or_build("feed", lambda: "new", 60), "new")
+        self.assertEqual(
+            stale_cache.get_or_build("feed", lambda: "newer", 60), "new")
+
+    def test_cold_key_built_without_waiting(self):
+        """Холодный ключ под чужой блокировкой строится сразу, без записи."""
+        cache.add("feed" + stale_cache.LOCK_SUFFIX, "other")
+        self.assertEqual(
+            stale_cache.get_or_build("feed", lambda: "cold", 60), "cold")
+        self.assertIsNone(cache.get("feed"))
+        self.assertEqual(cache.get("feed" + stale_cache.LOCK_SUFFIX), "other")
+
+    def test_foreign_lock_kept(self):
+        """Истекшая блокировка, которую взял другой воркер, не удаляется."""
+        lock = "feed" + stale_cache.LOCK_SUFFIX
+
+        def build():
+            # Наша блокировка истекла, ее взял другой воркер.
+            cache.set(lock, "other")
+            return "value"
+
+        stale_cache.get_or_build("feed", build, 60)
+        self.assertEqual(cache.get(lock), "other")
+        self.assertEqual(
+            stale_cache.get_or_build("feed", self.fail, 60), "value")
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, MEDIA_SENDFILE="")
+class MediaServingTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.name = "posts/ab/cd/" + "abcd" * 16 + ".gif"
+        cls.content = bytes(range(100))
+        os.makedirs(os.path.join(TEMP_MEDIA_ROOT, "posts/ab/cd"))
+        for name in (cls.name, "legacy.gif", "posts/.upload-x"):
+            with open(os.path.join(TEMP_MEDIA_ROOT, name), "wb") as file:
+                file.write(cls.content)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def get(self, name, **headers):
+        return self.client.get(settings.MEDIA_URL + name, **headers)
+
+    def test_full_file(self):
+        """Файл отдается потоком, имя с хешем кэшируется навсегда."""
+        response = self.get(self.name)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(b"".join(response.streaming_content), self.content)
+        self.assertEqual(response["Content-Type"], "image/gif")
+        self.assertEqual(response["Content-Length"], "100")
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertNotIn("immutable", self.get("legacy.gif")["Cache-Control"])
+
+    def test_ranges(self):
+        """Range отдает часть файла, недостижимый диапазон - 416."""
+        cases = (
+            ("bytes=10-19", "bytes 10-19/100", self.content[10:20]),
+            ("bytes=90-", "bytes 90-99/100", self.content[90:]),
+            ("bytes=-5", "bytes 95-99/100", self.content[95:]),
+        )
+        for header, content_range, content in cases:
+            with self.subTest(header=header):
+                response = self.get(self.name, HTTP_RANGE=header)
+                self.assertEqual(
+                    response.status_code, HTTPStatus.PARTIAL_CONTENT)
+                self.assertEqual(response["Content-Range"], content_range)
+                self.assertEqual(
+                    b"".join(response.streaming_content), content)
+        response = self.get(self.name, HTTP_RANGE="bytes=200-")
+        self.assertEqual(
+            response.status_code, HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+        response = self.get(
+            self.name, HTTP_RANGE="bytes=0-1", HTTP_IF_RANGE='"old"')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_conditional_get(self):
+        etag = self.get(self.name)["ETag"]
+        response = self.get(self.name, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_hidden_and_outside_files(self):
+        for name in ("posts/.upload-x", "../settings.py", "posts"):
+            with self.subTest(name=name):
+                self.assertEqual(
+                    self.get(name).status_code, HTTPStatus.NOT_FOUND)
+
+    @override_settings(MEDIA_SENDFILE="x-accel-redirect")
+    def test_accel_redirect(self):
+        response = self.get(self.name)
+        self.assertEqual(
+            response["X-Accel-Redirect"],
+            settings.MEDIA_ACCEL_PREFIX + self.name)
+        self.assertEqual(response.content, b"")
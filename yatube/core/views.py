@@ -1,4 +1,18 @@
+import mimetypes
+import os
+from http import HTTPStatus
+from stat import S_ISREG
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
 from django.shortcuts import render
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.views.decorators.http import require_safe
+
+from . import media, metrics
 
 
 def page_not_found(request, exception):
@@ -18,3 +32,58 @@ def server_error(request):
 
 def permission_denied(request, exception):
     return render(request, 'core/403.html', status=403)
+
+
+@staff_member_required
+def show_metrics(request):
+    return JsonResponse(metrics.snapshot())
+
+
+@require_safe
+def serve_media(request, path):
+    """Отдает файл из MEDIA_ROOT с поддержкой Range и условного GET."""
+    if any(part.startswith(".") for part in path.split("/")):
+        # Скрытые и временные файлы хранилища не раздаем.
+        raise Http404
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        stat = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404
+    if not S_ISREG(stat.st_mode):
+        raise Http404
+    etag = media.etag(stat)
+    last_modified = int(stat.st_mtime)
+    not_modified = get_conditional_response(
+        request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return media.set_headers(not_modified, path, stat)
+    content_type = (
+        mimetypes.guess_type(full_path)[0] or "application/octet-stream")
+    response = HttpResponse(content_type=content_type)
+    if media.sendfile_headers(response, path, full_path):
+        # Range и отдачу файла фронтенд обработает сам.
+        return media.set_headers(response, path, stat)
+    try:
+        byte_range = media.requested_range(
+            request, stat.st_size, etag, last_modified)
+    except ValueError:
+        response = HttpResponse(
+            status=HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+        response["Content-Range"] = f"bytes */{stat.st_size}"
+        return response
+    file = open(full_path, "rb")
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type)
+    else:
+        start, length = byte_range
+        response = FileResponse(
+            media.RangeFile(file, start, length),
+            status=HTTPStatus.PARTIAL_CONTENT,
+            content_type=content_type,
+        )
+        response["Content-Length"] = length
+        response["Content-Range"] = (
+            f"bytes {start}-{start + length - 1}/{stat.st_size}")
+    response.block_size = media.BLOCK_SIZE
+    return media.set_headers(response, path, stat)
@@ -1,4 +1,5 @@
 from django.contrib import admin
+from . import search
 from .models import Post, Group, Comment
 
 
@@ -13,6 +14,12 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ("pub_date",)
     empty_value_display = "-пусто-"
 
+    def get_search_results(self, request, queryset, search_term):
+        # Ищем по индексу поиска, а не LIKE по search_fields.
+        if not search_term:
+            return queryset, False
+        return search.backend().filter(queryset, search_term), False
+
 
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group)
@@ -0,0 +1,191 @@
+"""Автодополнение авторов и групп по префиксу.
+
+Индекс - отсортированный список ключей в памяти процесса: подсказки
+ищутся бинарным поиском, без запросов к базе. Изменения приходят из
+сигналов: они пишутся в общий кэш под очередным номером, и каждый
+процесс применяет пропущенные изменения при следующем запросе. Если
+часть журнала уже вытеснена из кэша, индекс строится заново. Свежий
+индекс стоит одного обращения к кэшу на запрос.
+"""
+import threading
+import uuid
+from bisect import bisect_left, insort
+
+from django.core.cache import cache
+from django.urls import reverse
+
+from core import metrics
+from .models import Group, User
+
+GENERATION_KEY = "autocomplete:generation"
+SEQUENCE_KEY = "autocomplete:seq"
+CHANGE_KEY = "autocomplete:change:{}"
+CHANGE_TIMEOUT = 24 * 60 * 60
+LIMIT = 10
+
+
+def _keys(kind, record):
+    if kind == "user":
+        return {record["username"].casefold()}
+    return {record["title"].casefold(), record["slug"].casefold()}
+
+
+class PrefixIndex:
+    """Отсортированные ключи (ключ, вид, pk) и записи объектов."""
+
+    def __init__(self, objects=()):
+        self.records = {}
+        self.entries = []
+        for kind, pk, record in objects:
+            self.records[kind, pk] = record
+            self.entries += [(key, kind, pk) for key in _keys(kind, record)]
+        self.entries.sort()
+
+    def put(self, kind, pk, record):
+        self.remove(kind, pk)
+        self.records[kind, pk] = record
+        for key in _keys(kind, record):
+            insort(self.entries, (key, kind, pk))
+
+    def remove(self, kind, pk):
+        record = self.records.pop((kind, pk), None)
+        if record is None:
+            return
+        for key in _keys(kind, record):
+            position = bisect_left(self.entries, (key, kind, pk))
+            del self.entries[position]
+
+    def complete(self, prefix, limit=LIMIT):
+        """Объекты с ключом, начинающимся с prefix, по порядку ключей."""
+        prefix = prefix.casefold()
+        found = {}
+        position = bisect_left(self.entries, (prefix,))
+        while position < len(self.entries) and len(found) < limit:
+            key, kind, pk = self.entries[position]
+            if not key.startswith(prefix):
+                break
+            found.setdefault((kind, pk), self.records[kind, pk])
+            position += 1
+        return found
+
+
+_lock = threading.Lock()
+_index = None
+_generation = None
+_sequence = None
+
+
+def _load():
+    users = User.objects.values("pk", "username", "first_name", "last_name")
+    groups = Group.objects.values("pk", "title", "slug")
+    objects = [
+        ("user", user.pop("pk"), user) for user in users.iterator()
+    ] + [
+        ("group", group.pop("pk"), group) for group in groups.iterator()
+    ]
+    metrics.incr("autocomplete.rebuilds")
+    return PrefixIndex(objects)
+
+
+def _apply(index, change):
+    kind, pk, record = change
+    if record is None:
+        index.remove(kind, pk)
+    else:
+        index.put(kind, pk, record)
+
+
+def _restart():
+    # Счетчик начинается заново только вместе с новым поколением: иначе
+    # процесс, ушедший по старому счетчику дальше, пропустил бы
+    # изменения с повторившимися номерами.
+    generation = uuid.uuid4().hex
+    cache.set(GENERATION_KEY, generation, None)
+    cache.add(SEQUENCE_KEY, 0, None)
+
+
+def _current():
+    """Поколение и номер последнего изменения одним запросом к кэшу."""
+    state = cache.get_many([GENERATION_KEY, SEQUENCE_KEY])
+    if len(state) < 2:
+        # Ключ вытеснен или кэш очищен: все процессы перестроят индекс.
+        _restart()
+        state = cache.get_many([GENERATION_KEY, SEQUENCE_KEY])
+    return state.get(GENERATION_KEY), state.get(SEQUENCE_KEY, 0)
+
+
+def _sync():
+    """Догоняет общий журнал изменений; вызывается под _lock."""
+    global _index, _generation, _sequence
+    generation, current = _current()
+    fresh = _index is not None and generation == _generation
+    if fresh and current == _sequence:
+        return
+    if fresh and current > _sequence:
+        keys = [
+            CHANGE_KEY.format(number)
+            for number in range(_sequence + 1, current + 1)
+        ]
+        changes = cache.get_many(keys)
+        if len(changes) == len(keys):
+            for key in keys:
+                _apply(_index, changes[key])
+            _sequence = current
+            return
+    # Номер читаем до загрузки: изменения, пришедшие во время нее,
+    # применятся еще раз при следующем запросе, и это безопасно.
+    _index, _generation, _sequence = _load(), generation, current
+
+
+def changed(kind, pk, record=None):
+    """Сообщает всем процессам о новой записи или удалении (record=None)."""
+    try:
+        number = cache.incr(SEQUENCE_KEY)
+    except ValueError:
+        # Счетчика нет: новое поколение заставит процессы перестроить
+        # индекс, и изменение попадет в него из базы.
+        _restart()
+        return
+    cache.set(CHANGE_KEY.format(number), (kind, pk, record), CHANGE_TIMEOUT)
+
+
+def reset():
+    """Заставляет все процессы перестроить индекс, например после импорта."""
+    cache.delete(GENERATION_KEY)
+
+
+def user_changed(user):
+    changed("user", user.pk, {
+        "username": user.username,
+        "first_name": user.first_name,
+        "last_name": user.last_name,
+    })
+
+
+def group_changed(group):
+    changed("group", group.pk, {"title": group.title, "slug": group.slug})
+
+
+def complete(prefix, limit=LIMIT):
+    """Подсказки для начала имени автора, названия или slug группы."""
+    with _lock:
+        _sync()
+        found = _index.complete(prefix, limit)
+    results = []
+    for (kind, _), record in found.items():
+        if kind == "user":
+            full_name = f"{record['first_name']} {record['last_name']}"
+            results.append({
+                "type": kind,
+                "label": record["username"],
+                "name": full_name.strip(),
+                "url": reverse("posts:profile", args=[record["username"]]),
+            })
+        else:
+            results.append({
+                "type": kind,
+                "label": record["title"],
+                "name": record["slug"],
+                "url": reverse("posts:group_list", args=[record["slug"]]),
+            })
+    return results
@@ -0,0 +1,58 @@
+from django.core.cache import cache
+from django.db.models import prefetch_related_objects
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.safestring import mark_safe
+
+from core import metrics
+from . import thumbnails
+from .models import Group, Post, User
+
+CARD_KEY = "post:{}:{}"
+CARD_TEMPLATE = "includes/posts_content.html"
+CARD_PRESET = "card"
+CARD_TIMEOUT = 60 * 60 * 24
+# Поля автора и группы, которые выводятся в карточке поста.
+CARD_FIELDS = {
+    User: ("username", "first_name", "last_name"),
+    Group: ("title", "slug"),
+}
+
+
+def card_key(post):
+    """Ключ карточки: меняется вместе с updated_at поста."""
+    return CARD_KEY.format(post.pk, post.updated_at.timestamp())
+
+
+def render_cards(posts):
+    """HTML карточек постов в том же порядке, одним cache.get_many.
+
+    Карточки общие для всех лент: главной, групп, профилей и подписок.
+    """
+    posts = list(posts)
+    keys = [card_key(post) for post in posts]
+    cards = cache.get_many(keys)
+    uncached = [post for key, post in zip(keys, posts) if key not in cards]
+    # Автор и группа нужны только карточкам, которых нет в кэше.
+    prefetch_related_objects(uncached, "author", "group")
+    # Превью всех новых карточек ищутся одним пакетом.
+    pictures = thumbnails.pictures(
+        [post.image for post in uncached], CARD_PRESET)
+    missing = {
+        card_key(post): render_to_string(CARD_TEMPLATE, {
+            "post": post,
+            "picture": pictures.get(post.image.name),
+        })
+        for post in uncached
+    }
+    if missing:
+        cache.set_many(missing, CARD_TIMEOUT)
+        cards.update(missing)
+    metrics.incr("post_cards.hit", len(posts) - len(missing))
+    metrics.incr("post_cards.miss", len(missing))
+    return [mark_safe(cards[key]) for key in keys]
+
+
+def touch(**lookup):
+    """Сдвигает updated_at постов, чтобы их карточки перерисовались."""
+    return Post.objects.filter(**lookup).update(updated_at=timezone.now())
@@ -0,0 +1,116 @@
+"""Валидаторы условного GET для публичных страниц.
+
+Считаются одним-двумя легкими запросами до рендеринга шаблона: если
+клиент прислал совпадающий If-None-Match или If-Modified-Since, view
+отвечает 304 и страницу не строит.
+"""
+import hashlib
+
+from django.conf import settings
+from django.db.models import Exists, OuterRef, Subquery
+
+from . import feed_cache
+from .models import Comment, Follow, Group, Post, UserStats
+
+
+def _etag(request, *parts):
+    # Страница зависит от адреса с курсором, пользователя в шапке и
+    # CSRF-cookie, токен которой встроен в формы.
+    parts += (
+        request.get_full_path(),
+        request.user.pk,
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME),
+    )
+    return hashlib.md5(
+        "|".join(map(str, parts)).encode()).hexdigest()
+
+
+def _last_modified(request, *dates):
+    # Время изменения не учитывает смену пользователя, поэтому отдаем его
+    # только анонимам: им достаточно сравнения по дате.
+    if request.user.is_authenticated or None in dates:
+        return None
+    return max(dates)
+
+
+def _post_state(request, post_id):
+    if not hasattr(request, "_post_state"):
+        last_comment = Comment.objects.filter(
+            post=OuterRef("pk")).order_by("-created").values("created")[:1]
+        request._post_state = Post.objects.filter(pk=post_id).annotate(
+            last_comment=Subquery(last_comment)).order_by().values_list(
+            "author_id", "updated_at", "comment_count",
+            "author__stats__posts_count", "last_comment").first()
+    return request._post_state
+
+
+def post_detail_etag(request, post_id):
+    state = _post_state(request, post_id)
+    if state is None:
+        return None
+    return _etag(request, *state)
+
+
+def post_detail_last_modified(request, post_id):
+    state = _post_state(request, post_id)
+    if state is None:
+        return None
+    author_id, updated_at, _, _, last_comment = state
+    # Число постов автора меняется вместе с его лентой.
+    return _last_modified(
+        request,
+        updated_at,
+        last_comment or updated_at,
+        feed_cache.changed(f"profile:{author_id}"),
+    )
+
+
+def _group_state(request, slug):
+    if not hasattr(request, "_group_state"):
+        request._group_state = Group.objects.filter(slug=slug).values_list(
+            "pk", "title", "description").first()
+    return request._group_state
+
+
+def group_etag(request, slug):
+    state = _group_state(request, slug)
+    if state is None:
+        return None
+    return _etag(
+        request, *state, feed_cache.version(f"group:{state[0]}"))
+
+
+def group_last_modified(request, slug):
+    state = _group_state(request, slug)
+    if state is None:
+        return None
+    return _last_modified(request, feed_cache.changed(f"group:{state[0]}"))
+
+
+def _profile_state(request, username):
+    if not hasattr(request, "_profile_state"):
+        following = Follow.objects.filter(
+            user_id=request.user.pk, author_id=OuterRef("user_id"))
+        request._profile_state = UserStats.objects.filter(
+            user__username=username).annotate(
+            following=Exists(following)).values_list(
+            "user_id", "user__first_name", "user__last_name",
+            "posts_count", "followers_count", "following_count",
+            "following").first()
+    return request._profile_state
+
+
+def profile_etag(request, username):
+    state = _profile_state(request, username)
+    if state is None:
+        return None
+    return _etag(
+        request, *state, feed_cache.version(f"profile:{state[0]}"))
+
+
+def profile_last_modified(request, username):
+    state = _profile_state(request, username)
+    if state is None:
+        return None
+    return _last_modified(
+        request, feed_cache.changed(f"profile:{state[0]}"))
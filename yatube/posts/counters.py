@@ -0,0 +1,81 @@
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+
+from .models import Follow, Post, User, UserStats
+
+COUNTER_FIELDS = ("posts_count", "followers_count", "following_count")
+
+
+def _counts(user_ids):
+    """Фактические значения счетчиков для пачки пользователей."""
+    counts = {
+        user_id: dict.fromkeys(COUNTER_FIELDS, 0) for user_id in user_ids
+    }
+    queries = (
+        ("posts_count", Post.objects, "author"),
+        ("followers_count", Follow.objects, "author"),
+        ("following_count", Follow.objects, "user"),
+    )
+    for name, manager, field in queries:
+        rows = manager.filter(**{f"{field}__in": user_ids}).order_by().values(
+            field).annotate(total=Count("pk")).values_list(field, "total")
+        for user_id, total in rows:
+            counts[user_id][name] = total
+    return counts
+
+
+def recount(user_ids):
+    """Записывает точные счетчики пользователей, создавая строки."""
+    counts = _counts(user_ids)
+    existing = UserStats.objects.in_bulk(user_ids)
+    changed, created = [], []
+    for user_id, values in counts.items():
+        stats = existing.get(user_id)
+        if stats is None:
+            created.append(UserStats(user_id=user_id, **values))
+            continue
+        if any(getattr(stats, name) != value
+               for name, value in values.items()):
+            for name, value in values.items():
+                setattr(stats, name, value)
+            changed.append(stats)
+    UserStats.objects.bulk_create(created, ignore_conflicts=True)
+    UserStats.objects.bulk_update(changed, COUNTER_FIELDS)
+    return len(created) + len(changed)
+
+
+def bump(user_id, **deltas):
+    """Атомарно сдвигает счетчики пользователя, например posts_count=1."""
+    updates = {
+        name: Greatest(F(name) + delta, 0) for name, delta in deltas.items()
+    }
+    updated = UserStats.objects.filter(user_id=user_id).update(**updates)
+    # Строки еще нет: сразу считаем точные значения. При уменьшении
+    # строку не создаем - пользователь может удаляться каскадом.
+    if not updated and all(delta > 0 for delta in deltas.values()):
+        recount([user_id])
+
+
+def get_stats(user):
+    """Счетчики пользователя; отсутствующая строка создается пересчетом."""
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        recount([user.pk])
+        return UserStats.objects.get(pk=user.pk)
+
+
+def repair(batch_size=1000):
+    """Сверяет счетчики всех пользователей пачками по pk.
+
+    Возвращает количество исправленных строк.
+    """
+    repaired = 0
+    last_pk = 0
+    while True:
+        user_ids = list(User.objects.filter(pk__gt=last_pk).order_by(
+            "pk").values_list("pk", flat=True)[:batch_size])
+        if not user_ids:
+            return repaired
+        repaired += recount(user_ids)
+        last_pk = user_ids[-1]
@@ -0,0 +1,123 @@
+"""Архив данных пользователя: ZIP, собираемый по ходу отдачи.
+
+Строки читаются из базы курсором порциями, картинки - блоками, а
+готовые байты архива сразу уходят клиенту, поэтому память не растет с
+числом постов. Строки JSONL в формате команды import_yatube.
+"""
+import json
+import zipfile
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Comment, Post
+
+# Сколько строк читать из базы за раз.
+CHUNK_SIZE = 500
+# Блок чтения картинки.
+BLOCK_SIZE = 64 * 1024
+
+
+class _Stream:
+    """Файл только для записи: накопленное забирается методом take()."""
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def write(self, data):
+        self.buffer += data
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+def _line(row):
+    return (json.dumps(row, ensure_ascii=False, cls=DjangoJSONEncoder)
+            + "\n").encode()
+
+
+def _profile(user):
+    return {
+        "type": "user",
+        "username": user.username,
+        "first_name": user.first_name,
+        "last_name": user.last_name,
+        "email": user.email,
+        "date_joined": user.date_joined,
+    }
+
+
+def _posts(user):
+    posts = Post.objects.filter(author=user).order_by("pk").values_list(
+        "pk", "group__slug", "text", "pub_date", "image")
+    for pk, group, text, pub_date, image in posts.iterator(CHUNK_SIZE):
+        yield {
+            "type": "post",
+            "id": pk,
+            "author": user.username,
+            "group": group,
+            "text": text,
+            "pub_date": pub_date,
+            "image": image or None,
+        }
+
+
+def _comments(user):
+    comments = Comment.objects.filter(author=user).order_by(
+        "pk").values_list("pk", "post_id", "text", "created")
+    for pk, post_id, text, created in comments.iterator(CHUNK_SIZE):
+        yield {
+            "type": "comment",
+            "id": pk,
+            "post": post_id,
+            "author": user.username,
+            "text": text,
+            "created": created,
+        }
+
+
+def _images(user):
+    # Одна картинка может быть у нескольких постов: в архиве она одна.
+    return Post.objects.filter(author=user).exclude(image="").order_by(
+        "image").values_list("image", flat=True).distinct().iterator(
+        CHUNK_SIZE)
+
+
+def archive(user):
+    """Байты ZIP-архива с профилем, постами, комментариями и картинками."""
+    stream = _Stream()
+    storage = Post._meta.get_field("image").storage
+    with zipfile.ZipFile(stream, "w", zipfile.ZIP_DEFLATED) as zip_file:
+        for name, rows in (
+            ("profile.jsonl", [_profile(user)]),
+            ("posts.jsonl", _posts(user)),
+            ("comments.jsonl", _comments(user)),
+        ):
+            # Размер заранее неизвестен: force_zip64 снимает предел 4 ГБ.
+            with zip_file.open(name, "w", force_zip64=True) as entry:
+                for row in rows:
+                    entry.write(_line(row))
+                    if stream.buffer:
+                        yield stream.take()
+        for name in _images(user):
+            try:
+                file = storage.open(name)
+            except FileNotFoundError:
+                continue
+            with file:
+                info = zipfile.ZipInfo(
+                    name, storage.get_modified_time(name).timetuple()[:6])
+                info.file_size = file.size
+                # Картинки уже сжаты, повторное сжатие только тратит время.
+                info.compress_type = zipfile.ZIP_STORED
+                with zip_file.open(info, "w") as entry:
+                    for block in file.chunks(BLOCK_SIZE):
+                        entry.write(block)
+                        if stream.buffer:
+                            yield stream.take()
+    yield stream.take()
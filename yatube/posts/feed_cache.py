@@ -0,0 +1,64 @@
+import time
+from datetime import datetime
+
+from django.core.cache import cache
+from django.utils import timezone
+
+VERSION_KEY = "feed_version:{}"
+CHANGED_KEY = "feed_changed:{}"
+
+
+def _initial():
+    # После вытеснения ключа версия не должна повториться, поэтому
+    # начинаем с текущего времени, а не с единицы.
+    return int(time.time() * 1000)
+
+
+def version(scope):
+    """Текущая версия ленты: входит в ключ кэша ее фрагментов."""
+    key = VERSION_KEY.format(scope)
+    value = cache.get(key)
+    if value is None:
+        cache.add(key, _initial(), None)
+        value = cache.get(key)
+    return value
+
+
+def changed(scope):
+    """Время последнего изменения ленты.
+
+    Если ключ вытеснен, изменение считаем случившимся сейчас.
+    """
+    key = CHANGED_KEY.format(scope)
+    value = cache.get(key)
+    if value is None:
+        cache.add(key, time.time(), None)
+        value = cache.get(key)
+    return datetime.fromtimestamp(value, timezone.utc)
+
+
+def touch(*scopes):
+    """Отмечает изменение страниц без сброса кэша их фрагментов."""
+    now = time.time()
+    cache.set_many(
+        {CHANGED_KEY.format(scope): now for scope in scopes}, None)
+
+
+def bump(*scopes):
+    """Делает закэшированные страницы лент устаревшими."""
+    for scope in scopes:
+        key = VERSION_KEY.format(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial(), None)
+    touch(*scopes)
+
+
+def post_scopes(post, group_ids=()):
+    """Ленты, на которых показан пост."""
+    scopes = {"index", f"profile:{post.author_id}"}
+    for group_id in {post.group_id, *group_ids}:
+        if group_id is not None:
+            scopes.add(f"group:{group_id}")
+    return scopes
@@ -1,5 +1,7 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 from .models import Post, Comment
+from .uploads import sanitize_image
 
 
 class PostForm(forms.ModelForm):
@@ -13,6 +15,13 @@ class PostForm(forms.ModelForm):
             "image": "Вставьте картинку"
         }
 
+    def clean_image(self):
+        image = self.cleaned_data.get("image")
+        # Проверяем только новую загрузку, а не уже сохраненный файл.
+        if isinstance(image, UploadedFile):
+            return sanitize_image(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
 
@@ -0,0 +1,43 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Post
+
+
+# Порядок таблицы лидеров совпадает с индексом post_leaderboard_idx.
+LEADERBOARD_ORDERING = ("-comment_count", "-pub_date", "-pk")
+
+
+def leaderboard_posts():
+    """Обсуждаемые посты; сортировка идет по индексу без агрегации."""
+    return Post.objects.filter(comment_count__gt=0)
+
+
+def comment_added(post_id):
+    Post.objects.filter(pk=post_id).update(
+        comment_count=F("comment_count") + 1)
+
+
+def comment_removed(post_id):
+    Post.objects.filter(pk=post_id, comment_count__gt=0).update(
+        comment_count=F("comment_count") - 1)
+
+
+def rebuild(batch_size=1000):
+    """Пересчитывает comment_count всех постов пачками по pk.
+
+    Возвращает количество обработанных постов.
+    """
+    comments = Comment.objects.filter(post=OuterRef("pk")).order_by().values(
+        "post").annotate(total=Count("pk")).values("total")
+    processed = 0
+    last_pk = 0
+    while True:
+        pks = list(Post.objects.filter(pk__gt=last_pk).order_by(
+            "pk").values_list("pk", flat=True)[:batch_size])
+        if not pks:
+            return processed
+        Post.objects.filter(pk__gte=pks[0], pk__lte=pks[-1]).update(
+            comment_count=Coalesce(Subquery(comments), 0))
+        processed += len(pks)
+        last_pk = pks[-1]
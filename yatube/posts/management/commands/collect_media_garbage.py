@@ -0,0 +1,260 @@
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import (
+    KVStore as CachedDBKVStore,
+)
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from posts import thumbnails
+from posts.models import Post
+
+
+def sorted_files(root, directory):
+    """Файлы каталога рекурсивно, в порядке сравнения путей как строк.
+
+    Каталог сортируется вместе с "/" на конце, иначе "a/b" оказался бы
+    раньше "a.jpg", хотя как строка он больше.
+    """
+    path = os.path.join(root, directory)
+    try:
+        entries = list(os.scandir(path))
+    except FileNotFoundError:
+        return
+    entries.sort(key=lambda entry: entry.name + (
+        "/" if entry.is_dir(follow_symlinks=False) else ""))
+    for entry in entries:
+        name = f"{directory}/{entry.name}"
+        if entry.is_dir(follow_symlinks=False):
+            yield from sorted_files(root, name)
+        elif entry.is_file(follow_symlinks=False):
+            yield name, entry
+
+
+def unreferenced(files, referenced):
+    """Слияние двух отсортированных потоков: файлы без ссылки из базы."""
+    referenced = iter(referenced)
+    current = next(referenced, None)
+    for name, entry in files:
+        while current is not None and current < name:
+            previous, current = current, next(referenced, None)
+            if current is not None and current < previous:
+                raise CommandError(
+                    "База вернула имена не в порядке сравнения строк, "
+                    "слияние невозможно: нужна бинарная сортировка."
+                )
+        if name != current:
+            yield name, entry
+
+
+def keyset(queryset, field, batch_size):
+    """Значения field по возрастанию, пачками по batch_size."""
+    queryset = queryset.order_by(field).values_list(field, flat=True)
+    last = ""
+    while True:
+        batch = list(queryset.filter(**{f"{field}__gt": last})[:batch_size])
+        if not batch:
+            return
+        yield from batch
+        last = batch[-1]
+
+
+class Command(BaseCommand):
+    help = (
+        "Удаляет картинки постов, на которые не ссылается ни один пост, "
+        "и превью таких картинок. С --dry-run только показывает, что "
+        "будет удалено."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="Ничего не удалять, только посчитать."
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=500,
+            help="Сколько файлов или записей удалять за раз."
+        )
+        parser.add_argument(
+            "--pause", type=float, default=0.5,
+            help="Пауза в секундах между пачками удаления."
+        )
+        parser.add_argument(
+            "--min-age", type=int, default=3600,
+            help="Не трогать файлы моложе стольких секунд: пост с "
+                 "только что загруженной картинкой может быть еще "
+                 "не сохранен."
+        )
+
+    def _batches(self, items):
+        batch = []
+        for item in items:
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _delete_in_batches(self, items, delete):
+        # Удаляем пачками с паузой, чтобы не нагружать диск и базу.
+        for batch in self._batches(items):
+            if not self.dry_run:
+                delete(batch)
+                time.sleep(self.pause)
+
+    def _old_enough(self, entry):
+        return entry.stat().st_mtime < self.started - self.min_age
+
+    def _report(self, kind, name, size):
+        self.found[kind] = self.found.get(kind, 0) + 1
+        self.freed += size
+        if self.verbosity > 1:
+            self.stdout.write(f"{kind}: {name}")
+
+    def _stale_sources(self):
+        """Превью картинок, которые больше не указаны ни в одном посте.
+
+        Такие записи остаются после удаления поста, переноса картинки
+        или смены хранилища поля Post.image.
+        """
+        prefix = add_prefix("", "thumbnails")
+        rows = KVStoreModel.objects.filter(key__startswith=prefix)
+        for keys in self._batches(keyset(rows, "key", self.batch_size)):
+            lists = dict(KVStoreModel.objects.filter(
+                key__in=keys).values_list("key", "value"))
+            sources = {key[len(prefix):]: key for key in keys}
+            images = dict(KVStoreModel.objects.filter(key__in=[
+                add_prefix(key) for key in sources]).values_list(
+                "key", "value"))
+            names = {
+                key: deserialize_image_file(images[add_prefix(key)]).name
+                for key in sources if add_prefix(key) in images
+            }
+            referenced = set(Post.objects.filter(
+                image__in=set(names.values())).values_list(
+                "image", flat=True))
+            for key, row in sources.items():
+                name = names.get(key)
+                # Ключ исходника включает хранилище: превью от прежнего
+                # хранилища той же картинки тоже устарели.
+                if name in referenced and thumbnails.source_file(
+                        name).key == key:
+                    continue
+                yield key, row, json.loads(lists[row])
+
+    def _drop_records(self, batch):
+        keys = []
+        for source_key, row, thumbnail_keys in batch:
+            keys += [row, add_prefix(source_key)]
+            keys += [add_prefix(key) for key in thumbnail_keys]
+        KVStoreModel.objects.filter(key__in=keys).delete()
+        default.kvstore.cache.delete_many(keys)
+
+    def _collect_records(self):
+        def counted():
+            for source_key, row, thumbnail_keys in self._stale_sources():
+                self._report("записи превью", source_key, 0)
+                # При --dry-run записи остаются, но их превью тоже мусор.
+                self.dropped.update(thumbnail_keys)
+                yield source_key, row, thumbnail_keys
+
+        self._delete_in_batches(counted(), self._drop_records)
+
+    def _orphan_originals(self, storage):
+        # Сюда попадают и брошенные временные файлы .upload-* хранилища.
+        referenced = keyset(
+            Post.objects.exclude(image="").distinct(), "image",
+            self.batch_size)
+        directory = Post._meta.get_field("image").upload_to.strip("/")
+        for name, entry in unreferenced(
+                sorted_files(storage.location, directory), referenced):
+            if self._old_enough(entry):
+                yield name, entry
+
+    def _delete_originals(self, storage, batch):
+        # Повторная проверка: пока шло слияние, новый пост мог сослаться
+        # на тот же файл, ведь одинаковые картинки хранятся один раз.
+        names = [name for name, _ in batch]
+        used = set(Post.objects.filter(image__in=names).values_list(
+            "image", flat=True))
+        for name in names:
+            if name not in used:
+                storage.delete(name)
+
+    def _live_thumbnails(self, storage, names):
+        # Ключ записи sorl - хеш имени файла превью и хранилища.
+        keys = {ImageFile(name, storage).key: name for name in names}
+        live = set(KVStoreModel.objects.filter(key__in=[
+            add_prefix(key) for key in keys]).values_list("key", flat=True))
+        return {
+            name for key, name in keys.items()
+            if add_prefix(key) in live and key not in self.dropped
+        }
+
+    def _orphan_thumbnails(self, storage):
+        # Записи sorl упорядочены по хешу, а не по имени файла, поэтому
+        # вместо слияния каждая пачка файлов проверяется одним запросом.
+        directory = sorl_settings.THUMBNAIL_PREFIX.strip("/")
+        files = sorted_files(storage.location, directory)
+        for batch in self._batches(files):
+            live = self._live_thumbnails(storage, [name for name, _ in batch])
+            for name, entry in batch:
+                if name not in live and self._old_enough(entry):
+                    yield name, entry
+
+    def _delete_thumbnails(self, storage, batch):
+        names = [name for name, _ in batch]
+        live = self._live_thumbnails(storage, names)
+        for name in names:
+            if name not in live:
+                storage.delete(name)
+
+    def _collect_files(self, kind, files, delete):
+        def counted():
+            for name, entry in files:
+                self._report(kind, name, entry.stat().st_size)
+                yield name, entry
+
+        self._delete_in_batches(counted(), delete)
+
+    def handle(self, *args, **options):
+        self.dry_run = options["dry_run"]
+        self.batch_size = max(options["batch_size"], 1)
+        self.pause = options["pause"]
+        self.min_age = options["min_age"]
+        self.verbosity = options["verbosity"]
+        self.started = time.time()
+        self.found = {}
+        self.freed = 0
+        self.dropped = set()
+        if not isinstance(default.kvstore, CachedDBKVStore):
+            raise CommandError(
+                "Сборка мусора поддерживает только хранилище превью "
+                "sorl в базе (cached_db)."
+            )
+        image_storage = Post._meta.get_field("image").storage
+        thumbnail_storage = default.storage
+        self._collect_records()
+        self._collect_files(
+            "картинка", self._orphan_originals(image_storage),
+            lambda batch: self._delete_originals(image_storage, batch))
+        self._collect_files(
+            "превью", self._orphan_thumbnails(thumbnail_storage),
+            lambda batch: self._delete_thumbnails(thumbnail_storage, batch))
+        summary = ", ".join(
+            f"{kind}: {count}" for kind, count in self.found.items()
+        ) or "мусора нет"
+        megabytes = self.freed / 1024 / 1024
+        if self.dry_run:
+            self.stdout.write(
+                f"Будет удалено: {summary}; освободится {megabytes:.1f} МБ")
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Удалено: {summary}; освобождено {megabytes:.1f} МБ"))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import export
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Сохраняет ZIP-архив с профилем, постами, комментариями и "
+        "картинками пользователя, как при скачивании с сайта."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("username", help="Имя пользователя.")
+        parser.add_argument(
+            "--output",
+            help="Файл архива; по умолчанию - yatube-<username>.zip."
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options["username"])
+        except User.DoesNotExist:
+            raise CommandError(
+                f"Пользователь {options['username']} не найден.")
+        path = options["output"] or f"yatube-{user.username}.zip"
+        size = 0
+        with open(path, "wb") as file:
+            for data in export.archive(user):
+                file.write(data)
+                size += len(data)
+        megabytes = size / 1024 / 1024
+        self.stdout.write(self.style.SUCCESS(
+            f"Архив {path}: {megabytes:.1f} МБ"))
@@ -0,0 +1,68 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import thumbnail_worker, thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        "Строит недостающие превью всех картинок постов в пуле процессов. "
+        "Нужна после добавления пресета в THUMBNAIL_PRESETS."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int,
+            default=settings.THUMBNAIL_WORKERS or os.cpu_count(),
+            help="Сколько процессов строят превью."
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=500,
+            help="Сколько картинок читать из базы за один запрос."
+        )
+
+    def _images(self, batch_size):
+        # Читаем пачками по имени, а не курсором: ready() пишет в posts_post.
+        images = Post.objects.exclude(image="").order_by("image").values_list(
+            "image", flat=True).distinct()
+        last = ""
+        while True:
+            batch = list(images.filter(image__gt=last)[:batch_size])
+            if not batch:
+                return
+            yield from batch
+            last = batch[-1]
+
+    def _finish(self, futures):
+        built = 0
+        for future in futures:
+            try:
+                name = future.result()
+            except Exception as error:
+                self.stderr.write(f"Ошибка построения превью: {error}")
+                continue
+            if name:
+                thumbnails.ready(name)
+                built += 1
+        return built
+
+    def handle(self, *args, **options):
+        workers = max(options["workers"], 1)
+        built = total = 0
+        pending = set()
+        with thumbnails.executor(workers) as pool:
+            for name in self._images(options["batch_size"]):
+                pending.add(pool.submit(thumbnail_worker.build, name))
+                total += 1
+                # Держим в очереди немного задач, а не все картинки сразу.
+                if len(pending) >= workers * 4:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    built += self._finish(done)
+            built += self._finish(wait(pending).done)
+        self.stdout.write(self.style.SUCCESS(
+            f"Картинок: {total}, построены превью для {built}"
+        ))
@@ -0,0 +1,370 @@
+import csv
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts import (
+    autocomplete, counters, feed_cache, leaderboard, search, timeline,
+)
+from posts.models import Comment, Follow, Group, Post, User
+
+# Порядок вставки внутри порции: записи ссылаются только на предыдущие.
+RECORD_TYPES = ("user", "group", "post", "comment", "follow")
+# Модель записи; объект строит метод команды _<тип>.
+MODELS = {
+    "user": User,
+    "group": Group,
+    "post": Post,
+    "comment": Comment,
+    "follow": Follow,
+}
+# Сколько пропущенных строк показать, остальные только посчитать.
+MAX_WARNINGS = 20
+
+
+def parse_date(value):
+    if not value:
+        return timezone.now()
+    date = parse_datetime(value)
+    if date is None:
+        raise ValueError(f"Неверная дата: {value}")
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date
+
+
+@contextmanager
+def explicit_dates():
+    """Отключает auto_now и auto_now_add: даты берутся из файла."""
+    fields = [
+        Post._meta.get_field("pub_date"),
+        Post._meta.get_field("updated_at"),
+        Comment._meta.get_field("created"),
+    ]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = (
+        "Загружает пользователей, группы, посты, комментарии и подписки "
+        "из JSONL или CSV пачками через bulk_create. После сбоя "
+        "повторный запуск продолжает с последней сохраненной порции."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "path",
+            help="Файл с данными; - читает стандартный ввод."
+        )
+        parser.add_argument(
+            "--format", choices=("jsonl", "csv"),
+            help="Формат файла; по умолчанию - по расширению."
+        )
+        parser.add_argument(
+            "--type", choices=RECORD_TYPES,
+            help="Тип всех записей файла; иначе он берется из поля type."
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=1000,
+            help="Сколько объектов вставлять одним запросом."
+        )
+        parser.add_argument(
+            "--chunk-size", type=int, default=10000,
+            help="Сколько строк загружать в одной транзакции."
+        )
+        parser.add_argument(
+            "--checkpoint",
+            help="Файл с номером последней загруженной строки; по "
+                 "умолчанию - <path>.checkpoint."
+        )
+        parser.add_argument(
+            "--restart", action="store_true",
+            help="Начать с первой строки, не глядя на checkpoint."
+        )
+
+    def _warn(self, message):
+        self.skipped += 1
+        if self.skipped <= MAX_WARNINGS:
+            self.stderr.write(f"Строка {self.line}: {message}")
+
+    def _load_checkpoint(self, options):
+        path = options["path"]
+        self.checkpoint = options["checkpoint"]
+        if not self.checkpoint and path != "-":
+            self.checkpoint = f"{path}.checkpoint"
+        if (not self.checkpoint or options["restart"]
+                or not os.path.exists(self.checkpoint)):
+            return {"rows": 0, "authors": [], "groups": []}
+        with open(self.checkpoint) as file:
+            return json.load(file)
+
+    def _save_checkpoint(self, rows):
+        if not self.checkpoint:
+            return
+        # Запись через временный файл: сбой не оставит checkpoint пустым.
+        state = {
+            "rows": rows,
+            "authors": sorted(self.authors),
+            "groups": sorted(self.groups),
+        }
+        temporary = f"{self.checkpoint}.tmp"
+        with open(temporary, "w") as file:
+            json.dump(state, file)
+        os.replace(temporary, self.checkpoint)
+
+    def _resolve(self, model, field, values, known):
+        """Дополняет карту имя -> pk объектами, которых в ней еще нет."""
+        missing = {value for value in values if value} - known.keys()
+        if missing:
+            known.update(model.objects.filter(
+                **{f"{field}__in": missing}).values_list(field, "pk"))
+
+    def _user(self, row):
+        return User(
+            username=row["username"],
+            first_name=row.get("first_name") or "",
+            last_name=row.get("last_name") or "",
+            email=row.get("email") or "",
+            # Пароль переносится только готовым хешем.
+            password=row.get("password") or make_password(None),
+            date_joined=parse_date(row.get("date_joined")),
+        )
+
+    def _group(self, row):
+        return Group(
+            slug=row["slug"],
+            title=row["title"],
+            description=row.get("description") or "",
+        )
+
+    def _post(self, row):
+        author_id = self.users.get(row.get("author"))
+        if author_id is None:
+            return self._warn(f"нет автора {row.get('author')}")
+        group_id = None
+        if row.get("group"):
+            group_id = self.groups_by_slug.get(row["group"])
+            if group_id is None:
+                return self._warn(f"нет группы {row['group']}")
+            self.groups.add(group_id)
+        self.authors.add(author_id)
+        pub_date = parse_date(row.get("pub_date"))
+        return Post(
+            pk=row.get("id"),
+            text=row["text"],
+            author_id=author_id,
+            group_id=group_id,
+            image=row.get("image") or "",
+            pub_date=pub_date,
+            updated_at=pub_date,
+        )
+
+    def _comment(self, row):
+        author_id = self.users.get(row.get("author"))
+        if author_id is None:
+            return self._warn(f"нет автора {row.get('author')}")
+        post_id = int(row["post"])
+        if post_id not in self.posts:
+            return self._warn(f"нет поста {post_id}")
+        return Comment(
+            pk=row.get("id"),
+            post_id=post_id,
+            author_id=author_id,
+            text=row["text"],
+            created=parse_date(row.get("created")),
+        )
+
+    def _follow(self, row):
+        user_id = self.users.get(row.get("user"))
+        author_id = self.users.get(row.get("author"))
+        if user_id is None or author_id is None:
+            return self._warn(
+                f"нет пользователя {row.get('user')} или {row.get('author')}")
+        if user_id == author_id:
+            return self._warn("подписка на самого себя")
+        self.authors.add(author_id)
+        return Follow(user_id=user_id, author_id=author_id)
+
+    def _by_type(self, chunk):
+        by_type = {record_type: [] for record_type in RECORD_TYPES}
+        for line, row in chunk:
+            record_type = self.type or row.get("type")
+            if record_type not in by_type:
+                self.line = line
+                self._warn(f"неизвестный тип {record_type}")
+                continue
+            by_type[record_type].append((line, row))
+        return by_type
+
+    def _resolve_references(self, by_type):
+        # Ссылки на то, что уже есть в базе, догружаем одним запросом
+        # на порцию, а ссылки на вставленное в ней - после вставки.
+        names = set()
+        for record_type in ("post", "comment", "follow"):
+            for _, row in by_type[record_type]:
+                names.update((row.get("author"), row.get("user")))
+        self._resolve(User, "username", names, self.users)
+        self._resolve(Group, "slug", {
+            row.get("group") for _, row in by_type["post"]
+        }, self.groups_by_slug)
+
+    def _build(self, record_type, rows):
+        build = getattr(self, f"_{record_type}")
+        if record_type == "comment":
+            self.posts = set(Post.objects.filter(pk__in={
+                int(row["post"]) for _, row in rows
+            }).values_list("pk", flat=True))
+        objects = []
+        for line, row in rows:
+            self.line = line
+            instance = build(row)
+            if instance is not None:
+                objects.append(instance)
+        return objects
+
+    def _inserted(self, record_type, objects):
+        # SQLite не возвращает pk из bulk_create: перечитываем.
+        if record_type == "user":
+            self._resolve(User, "username", [
+                user.username for user in objects], self.users)
+        elif record_type == "group":
+            self._resolve(Group, "slug", [
+                group.slug for group in objects], self.groups_by_slug)
+
+    def _insert(self, chunk):
+        by_type = self._by_type(chunk)
+        self._resolve_references(by_type)
+        with transaction.atomic(), explicit_dates():
+            for record_type in RECORD_TYPES:
+                objects = self._build(record_type, by_type[record_type])
+                # Повтор порции после сбоя не создает дублей: пропускаются
+                # существующие username, slug, подписки и pk из файла.
+                MODELS[record_type].objects.bulk_create(
+                    objects, batch_size=self.batch_size,
+                    ignore_conflicts=True)
+                self._inserted(record_type, objects)
+
+    def _rows(self, file, format_):
+        """Пары (номер строки файла, запись); пустые поля CSV - None.
+
+        Номер строки, которую сейчас читаем, хранится в self.line, чтобы
+        ошибка разбора указала на нее.
+        """
+        if format_ == "csv":
+            reader = csv.DictReader(file)
+            for row in reader:
+                self.line = reader.line_num
+                yield self.line, {
+                    key: value or None for key, value in row.items()}
+            return
+        for self.line, text in enumerate(file, 1):
+            if text.strip():
+                yield self.line, json.loads(text)
+
+    def _chunks(self, rows, start):
+        chunk = []
+        for line, row in rows:
+            if line <= start:
+                continue
+            chunk.append((line, row))
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _rebuild(self):
+        """Пересчитывает то, что при обычном сохранении делают сигналы."""
+        self.stdout.write("Пересчет счетчиков, лент и индекса поиска...")
+        counters.repair(self.batch_size)
+        leaderboard.rebuild(self.batch_size)
+        search.backend().rebuild()
+        follows = Follow.objects.filter(
+            author_id__in=self.authors).order_by().values_list(
+            "user_id", "author_id")
+        for user_id, author_id in follows.iterator():
+            timeline.backfill(user_id, author_id)
+        cache.delete_many([
+            timeline.RECENT_KEY.format(author_id)
+            for author_id in self.authors
+        ])
+        autocomplete.reset()
+        feed_cache.bump(
+            "index",
+            *(f"profile:{author_id}" for author_id in self.authors),
+            *(f"group:{group_id}" for group_id in self.groups),
+        )
+
+    def _open(self, path):
+        if path == "-":
+            return sys.stdin
+        try:
+            return open(path, newline="")
+        except OSError as error:
+            raise CommandError(error)
+
+    def _import(self, rows, start):
+        """Загружает порции после строки start; возвращает последнюю."""
+        done = start
+        started = time.monotonic()
+        try:
+            for chunk in self._chunks(rows, start):
+                self._insert(chunk)
+                done = chunk[-1][0]
+                self._save_checkpoint(done)
+                rate = (done - start) / max(time.monotonic() - started, 1e-6)
+                self.stdout.write(f"Строк: {done}, {rate:.0f} строк/с")
+        except (KeyError, TypeError, ValueError) as error:
+            # Сюда же попадает неверный JSON: json.JSONDecodeError -
+            # подкласс ValueError.
+            raise CommandError(
+                f"Строка {self.line}: {error!r}; загружено строк: "
+                f"{done}, повторный запуск продолжит с них."
+            )
+        return done
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        format_ = options["format"] or (
+            "csv" if path.lower().endswith(".csv") else "jsonl")
+        self.type = options["type"]
+        self.batch_size = max(options["batch_size"], 1)
+        self.chunk_size = max(options["chunk_size"], 1)
+        state = self._load_checkpoint(options)
+        # Авторы и группы, чьи ленты нужно обновить: из checkpoint тоже,
+        # иначе после возобновления они бы потерялись.
+        self.authors = set(state["authors"])
+        self.groups = set(state["groups"])
+        self.users = {}
+        self.groups_by_slug = {}
+        self.posts = set()
+        self.skipped = 0
+        self.line = 0
+        start = state["rows"]
+        if start:
+            self.stdout.write(f"Продолжаем после строки {start}")
+        with self._open(path) as file:
+            done = self._import(self._rows(file, format_), start)
+        if self.skipped:
+            self.stderr.write(f"Пропущено строк: {self.skipped}")
+        self._rebuild()
+        if self.checkpoint and os.path.exists(self.checkpoint):
+            os.remove(self.checkpoint)
+        self.stdout.write(self.style.SUCCESS(
+            f"Загружено строк: {done - start}"))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from posts import leaderboard
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает количество комментариев постов с нуля."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=1000,
+            help="Сколько постов пересчитывать за один запрос."
+        )
+
+    def handle(self, *args, **options):
+        processed = leaderboard.rebuild(options["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Пересчитано постов: {processed}")
+        )
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = (
+        "Строит индекс поиска по постам заново. Нужна после массовых "
+        "изменений мимо сигналов, например update() или bulk_create()."
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            search.backend().rebuild()
+        self.stdout.write(self.style.SUCCESS("Индекс поиска перестроен"))
@@ -0,0 +1,77 @@
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from posts import feed_cache
+from posts.models import Post
+from posts.storage import is_content_name
+
+
+class Command(BaseCommand):
+    help = (
+        "Переносит картинки постов в хранилище по хешу содержимого "
+        "и обновляет записи пачками. Повторный запуск продолжает работу."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=500,
+            help="Сколько постов обновлять в одной транзакции."
+        )
+        parser.add_argument(
+            "--delete-old", action="store_true",
+            help="Удалять старые файлы после переноса."
+        )
+
+    def _relocate(self, post):
+        storage = post.image.storage
+        old_name = post.image.name
+        if not storage.exists(old_name):
+            self.stderr.write(f"Пост {post.pk}: нет файла {old_name}")
+            return None
+        with storage.open(old_name) as content:
+            # Хранилище само выбирает имя по хешу содержимого.
+            post.image.name = storage.save(old_name, File(content))
+        return old_name
+
+    def _delete_unused(self, storage, names):
+        # Импорт мог дать одно старое имя нескольким постам: файл нужен,
+        # пока на него ссылается пост из следующих пачек.
+        used = set(Post.objects.filter(image__in=names).values_list(
+            "image", flat=True))
+        for name in names - used:
+            storage.delete(name)
+
+    def handle(self, *args, **options):
+        storage = Post._meta.get_field("image").storage
+        posts = Post.objects.exclude(image="").order_by("pk").only(
+            "pk", "image", "author", "group")
+        relocated = 0
+        last_pk = 0
+        while True:
+            batch = list(posts.filter(pk__gt=last_pk)[:options["batch_size"]])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            changed, old_names = [], set()
+            for post in batch:
+                if is_content_name(post.image.name):
+                    continue
+                old_name = self._relocate(post)
+                if old_name is not None:
+                    post.updated_at = timezone.now()
+                    changed.append(post)
+                    old_names.add(old_name)
+            with transaction.atomic():
+                Post.objects.bulk_update(changed, ["image", "updated_at"])
+            for post in changed:
+                feed_cache.bump(*feed_cache.post_scopes(post))
+            if options["delete_old"]:
+                self._delete_unused(storage, old_names)
+            relocated += len(changed)
+            self.stdout.write(f"Перенесено картинок: {relocated}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Готово, перенесено картинок: {relocated}. Превью новых "
+            "файлов построит команда generate_thumbnails."
+        ))
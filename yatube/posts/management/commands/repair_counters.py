@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters, leaderboard
+
+
+class Command(BaseCommand):
+    help = (
+        "Сверяет денормализованные счетчики постов, подписчиков, подписок "
+        "и комментариев с данными и исправляет расхождения."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=1000,
+            help="Сколько строк сверять за один проход."
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        repaired = counters.repair(batch_size)
+        self.stdout.write(self.style.SUCCESS(
+            f"Исправлено счетчиков пользователей: {repaired}"))
+        processed = leaderboard.rebuild(batch_size)
+        self.stdout.write(
+            self.style.SUCCESS(f"Пересчитано комментариев постов: {processed}")
+        )
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from posts import trending
+
+
+class Command(BaseCommand):
+    help = (
+        "Обновляет рейтинг постов за день и неделю. "
+        "Запускается периодически, например раз в несколько минут."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full", action="store_true",
+            help="Пересчитать окна целиком, а не по приращению."
+        )
+
+    def handle(self, *args, **options):
+        for window in trending.WINDOWS:
+            changed = trending.update_window(window, full=options["full"])
+            self.stdout.write(
+                self.style.SUCCESS(f"{window}: обновлено постов {changed}")
+            )
@@ -0,0 +1,33 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:30
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_comments(apps, schema_editor):
+    Post = apps.get_model("posts", "Post")
+    Comment = apps.get_model("posts", "Comment")
+    comments = Comment.objects.filter(post=OuterRef("pk")).order_by().values(
+        "post").annotate(total=Count("pk")).values("total")
+    Post.objects.update(comment_count=Coalesce(Subquery(comments), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0007_timelineentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество комментариев'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-comment_count', '-pub_date'], name='post_leaderboard_idx'),
+        ),
+        migrations.RunPython(count_comments, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0008_post_comment_count'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='comment',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата публикации'),
+        ),
+        migrations.CreateModel(
+            name='PostScore',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window', models.CharField(choices=[('day', 'День'), ('week', 'Неделя')], max_length=8, verbose_name='Окно')),
+                ('score', models.FloatField(default=0, verbose_name='Рейтинг')),
+                ('updated', models.DateTimeField(verbose_name='Рассчитан')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scores', to='posts.Post', verbose_name='Пост')),
+            ],
+            options={
+                'verbose_name': 'Рейтинг поста',
+                'verbose_name_plural': 'Рейтинги постов',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='postscore',
+            index=models.Index(fields=['window', '-score', '-post'], name='postscore_window_score_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='postscore',
+            unique_together={('window', 'post')},
+        ),
+    ]
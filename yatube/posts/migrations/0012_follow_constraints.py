@@ -0,0 +1,68 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:35
+
+from django.db import migrations, models
+from django.db.models import Count, F, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+import django.db.models.expressions
+
+BATCH_SIZE = 500
+
+
+def remove_duplicates(apps, schema_editor):
+    """Оставляет по одной подписке на пару и удаляет подписки на себя."""
+    Follow = apps.get_model("posts", "Follow")
+    UserStats = apps.get_model("posts", "UserStats")
+    affected = set()
+    self_follows = Follow.objects.filter(user=F("author"))
+    affected.update(self_follows.values_list("user_id", flat=True))
+    self_follows.delete()
+    while True:
+        duplicates = list(
+            Follow.objects.order_by().values("user", "author").annotate(
+                total=Count("pk"), keep=Min("pk")).filter(
+                total__gt=1)[:BATCH_SIZE]
+        )
+        if not duplicates:
+            break
+        for row in duplicates:
+            Follow.objects.filter(
+                user_id=row["user"], author_id=row["author"]
+            ).exclude(pk=row["keep"]).delete()
+            affected.update((row["user"], row["author"]))
+
+    def total(field):
+        follows = Follow.objects.filter(**{field: OuterRef("user")})
+        return Coalesce(Subquery(follows.order_by().values(field).annotate(
+            total=Count("pk")).values("total")), 0)
+
+    affected = sorted(affected)
+    for start in range(0, len(affected), BATCH_SIZE):
+        UserStats.objects.filter(
+            user_id__in=affected[start:start + BATCH_SIZE]
+        ).update(
+            followers_count=total("author"),
+            following_count=total("user"),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='follow',
+            name='follow_user_author_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_follow'),
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.CheckConstraint(check=models.Q(_negated=True, user=django.db.models.expressions.F('author')), name='follow_not_self'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:39
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_updated_at(apps, schema_editor):
+    Post = apps.get_model("posts", "Post")
+    Post.objects.update(updated_at=F("pub_date"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_follow_constraints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата изменения'),
+        ),
+        migrations.RunPython(fill_updated_at, migrations.RunPython.noop),
+    ]
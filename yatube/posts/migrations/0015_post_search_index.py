@@ -0,0 +1,42 @@
+# Generated by Django 2.2.16 on 2026-10-18 21:05
+
+from django.conf import settings
+from django.db import migrations
+
+FTS_TABLE = "posts_post_fts"
+
+
+def create_index(apps, schema_editor):
+    # Индекс FTS5 есть только в SQLite, на других базах поиск идет LIKE.
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+        "text, author, group_title, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+    schema_editor.execute(
+        f"INSERT INTO {FTS_TABLE} (rowid, text, author, group_title) "
+        "SELECT p.id, p.text, "
+        "u.username || ' ' || u.first_name || ' ' || u.last_name, "
+        "COALESCE(g.title, '') "
+        "FROM posts_post p JOIN auth_user u ON u.id = p.author_id "
+        "LEFT JOIN posts_group g ON g.id = p.group_id"
+    )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0014_content_addressed_images'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
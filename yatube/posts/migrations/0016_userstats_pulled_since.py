@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_post_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='pulled_since',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Посты подмешиваются с'),
+        ),
+    ]
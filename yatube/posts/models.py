@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from .storage import ContentAddressedStorage
 
 User = get_user_model()
 
@@ -58,12 +59,42 @@ class Post(models.Model):
     image = models.ImageField(
         verbose_name="Картинка",
         upload_to="posts/",
+        storage=ContentAddressedStorage(),
         help_text="Вставьте картинку",
         blank=True,
     )
+    comment_count = models.PositiveIntegerField(
+        verbose_name="Количество комментариев",
+        default=0,
+        editable=False
+    )
+    updated_at = models.DateTimeField(
+        verbose_name="Дата изменения",
+        auto_now=True
+    )
 
     class Meta:
         ordering = ["-pub_date"]
+        # Индексы повторяют сортировку лент (-pub_date, -pk), чтобы
+        # выборка страницы шла по индексу без сортировки.
+        indexes = [
+            models.Index(
+                fields=["-comment_count", "-pub_date", "-id"],
+                name="post_leaderboard_idx"
+            ),
+            models.Index(
+                fields=["-pub_date", "-id"],
+                name="post_pub_date_idx"
+            ),
+            models.Index(
+                fields=["author", "-pub_date", "-id"],
+                name="post_author_date_idx"
+            ),
+            models.Index(
+                fields=["group", "-pub_date", "-id"],
+                name="post_group_date_idx"
+            ),
+        ]
         verbose_name = "Пост"
         verbose_name_plural = "Посты"
 
@@ -89,13 +120,99 @@ class Comment(models.Model):
     )
     created = models.DateTimeField(
         verbose_name="Дата публикации",
-        auto_now_add=True
+        auto_now_add=True,
+        db_index=True
     )
 
+    class Meta:
+        ordering = ["created", "id"]
+        indexes = [
+            models.Index(
+                fields=["post", "created", "id"],
+                name="comment_post_created_idx"
+            ),
+        ]
+
     def __str__(self):
         return self.text
 
 
+class UserStats(models.Model):
+    """Счетчики пользователя, обновляемые вместе с постами и подписками."""
+    user = models.OneToOneField(
+        User,
+        verbose_name="Пользователь",
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="stats"
+    )
+    posts_count = models.PositiveIntegerField(
+        verbose_name="Постов",
+        default=0
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name="Подписчиков",
+        default=0,
+        db_index=True
+    )
+    following_count = models.PositiveIntegerField(
+        verbose_name="Подписок",
+        default=0
+    )
+    # С этого момента посты автора не раскладываются по лентам, а
+    # подмешиваются при чтении; None - автор ниже порога.
+    pulled_since = models.DateTimeField(
+        verbose_name="Посты подмешиваются с",
+        blank=True,
+        null=True,
+        editable=False
+    )
+
+    class Meta:
+        verbose_name = "Счетчики пользователя"
+        verbose_name_plural = "Счетчики пользователей"
+
+
+class PostScore(models.Model):
+    """Рейтинг поста в скользящем окне с затуханием веса комментариев.
+
+    Пересчитывается командой update_trending, страницы только читают.
+    """
+    WINDOW_CHOICES = (
+        ("day", "День"),
+        ("week", "Неделя"),
+    )
+    post = models.ForeignKey(
+        Post,
+        verbose_name="Пост",
+        on_delete=models.CASCADE,
+        related_name="scores"
+    )
+    window = models.CharField(
+        verbose_name="Окно",
+        max_length=8,
+        choices=WINDOW_CHOICES
+    )
+    score = models.FloatField(
+        verbose_name="Рейтинг",
+        default=0
+    )
+    updated = models.DateTimeField(
+        verbose_name="Рассчитан"
+    )
+
+    class Meta:
+        unique_together = ("window", "post")
+        indexes = [
+            models.Index(
+                fields=["window", "-score", "-post"],
+                name="postscore_window_score_idx"
+            ),
+        ]
+        verbose_name = "Рейтинг поста"
+        verbose_name_plural = "Рейтинги постов"
+
+
 class Follow(models.Model):
     user = models.ForeignKey(
         User,
@@ -109,3 +226,60 @@ class Follow(models.Model):
         on_delete=models.CASCADE,
         related_name="following"
     )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "author"],
+                name="unique_follow"
+            ),
+            models.CheckConstraint(
+                check=~models.Q(user=models.F("author")),
+                name="follow_not_self"
+            ),
+        ]
+
+
+class TimelineEntry(models.Model):
+    """Запись ленты подписок: пост автора, на которого подписан user.
+
+    Заполняется при публикации поста и при подписке, поэтому лента
+    читается одним диапазоном индекса (user, pub_date).
+    """
+    user = models.ForeignKey(
+        User,
+        verbose_name="Подписчик",
+        on_delete=models.CASCADE,
+        related_name="timeline"
+    )
+    post = models.ForeignKey(
+        Post,
+        verbose_name="Пост",
+        on_delete=models.CASCADE,
+        related_name="timeline_entries"
+    )
+    author = models.ForeignKey(
+        User,
+        verbose_name="Автор",
+        on_delete=models.CASCADE,
+        related_name="+"
+    )
+    pub_date = models.DateTimeField(
+        verbose_name="Дата публикации"
+    )
+
+    class Meta:
+        ordering = ["-pub_date", "-post_id"]
+        unique_together = ("user", "post")
+        indexes = [
+            models.Index(
+                fields=["user", "-pub_date", "-post"],
+                name="timeline_user_date_idx"
+            ),
+            models.Index(
+                fields=["user", "author"],
+                name="timeline_user_author_idx"
+            ),
+        ]
+        verbose_name = "Запись ленты"
+        verbose_name_plural = "Лента подписок"
@@ -0,0 +1,119 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+
+
+class CursorPaginator(Paginator):
+    """Постраничный вывод по ключу сортировки (keyset) вместо OFFSET.
+
+    Курсор - непрозрачный токен с направлением и значениями ключа
+    крайней записи страницы. Страница - обычный ``Page`` с атрибутами
+    ``cursor``, ``next_cursor`` и ``previous_cursor``.
+    """
+
+    def __init__(self, object_list, per_page,
+                 ordering=("-pub_date", "-pk"), **kwargs):
+        super().__init__(object_list.order_by(*ordering), per_page, **kwargs)
+        self.ordering = tuple(ordering)
+
+    def _field(self, name):
+        query = self.object_list.query
+        if name in query.annotations:
+            return query.annotations[name].output_field
+        opts = self.object_list.model._meta
+        return opts.pk if name == "pk" else opts.get_field(name)
+
+    def get_key_fields(self):
+        """Имена полей ключа сортировки."""
+        return [field.lstrip("-") for field in self.ordering]
+
+    def get_key(self, obj):
+        """Значения полей сортировки записи."""
+        names = self.get_key_fields()
+        if isinstance(obj, dict):
+            return tuple(obj[name] for name in names)
+        return tuple(getattr(obj, name) for name in names)
+
+    def encode_cursor(self, key, backwards=False):
+        values = [
+            value.isoformat() if hasattr(value, "isoformat") else value
+            for value in key
+        ]
+        raw = json.dumps([int(backwards)] + values, separators=(",", ":"))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+    def decode_cursor(self, token):
+        """Возвращает (ключ, назад) или None для битого курсора."""
+        if not token:
+            return None
+        try:
+            padded = token + "=" * (-len(token) % 4)
+            raw = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            backwards, *values = raw
+            if len(values) != len(self.ordering):
+                return None
+            key = tuple(
+                self._field(field.lstrip("-")).to_python(value)
+                for field, value in zip(self.ordering, values)
+            )
+        except (ValueError, TypeError, binascii.Error, ValidationError):
+            return None
+        return key, bool(backwards)
+
+    def keyset_filter(self, key, backwards=False):
+        """Условие «строго после key» в лексикографическом порядке."""
+        condition = Q()
+        for i, field in enumerate(self.ordering):
+            name = field.lstrip("-")
+            descending = field.startswith("-") != backwards
+            part = Q(**{f"{name}__{'lt' if descending else 'gt'}": key[i]})
+            for prev_field, prev_value in zip(self.ordering[:i], key[:i]):
+                part &= Q(**{prev_field.lstrip("-"): prev_value})
+            condition |= part
+        return condition
+
+    def fetch(self, key, backwards, limit):
+        """Не более limit записей после key в порядке обхода."""
+        queryset = self.object_list
+        if backwards:
+            queryset = queryset.reverse()
+        if key is not None:
+            queryset = queryset.filter(self.keyset_filter(key, backwards))
+        return list(queryset[:limit])
+
+    def get_cursor_page(self, token):
+        decoded = self.decode_cursor(token)
+        key, backwards = decoded if decoded else (None, False)
+        items = self.fetch(key, backwards, self.per_page + 1)
+        has_more = len(items) > self.per_page
+        items = items[:self.per_page]
+        if backwards:
+            items.reverse()
+            has_previous, has_next = has_more, True
+        else:
+            has_previous, has_next = key is not None, has_more
+        page = Page(items, 1, self)
+        page.cursor = token if decoded else ""
+        self._set_cursors(page, has_previous, has_next)
+        return page
+
+    def get_page(self, number):
+        """Старые ссылки вида ?page=N: OFFSET, но с курсорами соседей."""
+        page = super().get_page(number)
+        page.object_list = list(page.object_list)
+        page.cursor = f"page-{page.number}"
+        self._set_cursors(page, page.has_previous(), page.has_next())
+        return page
+
+    def _set_cursors(self, page, has_previous, has_next):
+        items = page.object_list
+        page.previous_cursor = page.next_cursor = None
+        if items and has_previous:
+            page.previous_cursor = self.encode_cursor(
+                self.get_key(items[0]), backwards=True)
+        if items and has_next:
+            page.next_cursor = self.encode_cursor(self.get_key(items[-1]))
@@ -0,0 +1,201 @@
+"""Полнотекстовый поиск по постам.
+
+Бэкенд задается настройкой POST_SEARCH_BACKEND. SQLiteFTSBackend ищет
+по виртуальной таблице FTS5 с текстом поста, именем автора и названием
+группы и ранжирует результаты через bm25. На других базах используется
+LikeBackend с поиском подстроки.
+"""
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import BooleanField, CharField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce, Concat
+from django.utils.module_loading import import_string
+
+from .models import Post
+from .paginator import CursorPaginator
+
+FTS_TABLE = "posts_post_fts"
+# Веса столбцов для bm25: текст, автор, группа.
+FTS_WEIGHTS = (1.0, 2.0, 2.0)
+MAX_TERMS = 10
+SEARCH_ORDERING = ("search_rank", "-pk")
+
+
+def terms(query):
+    """Слова запроса без синтаксиса FTS."""
+    return re.findall(r"\w+", query)[:MAX_TERMS]
+
+
+class LikeBackend:
+    """Поиск подстрок без индекса: каждое слово в тексте, авторе или группе.
+
+    Все найденные посты равнозначны, порядок - от новых к старым.
+    """
+
+    def index(self, **lookup):
+        pass
+
+    def remove(self, *pks):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def _condition(self, query):
+        condition = Q()
+        for term in terms(query):
+            condition &= (
+                Q(text__icontains=term)
+                | Q(author__username__icontains=term)
+                | Q(author__first_name__icontains=term)
+                | Q(author__last_name__icontains=term)
+                | Q(group__title__icontains=term)
+            )
+        return condition
+
+    def filter(self, queryset, query):
+        if not terms(query):
+            return queryset.none()
+        return queryset.filter(self._condition(query))
+
+    def search(self, query, key=None, backwards=False, limit=10):
+        """Не более limit пар (ранг, pk) после key в порядке поиска."""
+        posts = self.filter(Post.objects.all(), query)
+        if key is not None:
+            posts = posts.filter(
+                **{"pk__gt" if backwards else "pk__lt": key[1]})
+        posts = posts.order_by("pk" if backwards else "-pk")
+        return [(0.0, pk) for pk in posts.values_list("pk", flat=True)[
+            :limit]]
+
+
+class SQLiteFTSBackend(LikeBackend):
+    """Индекс FTS5 в SQLite; rowid строки индекса равен pk поста."""
+
+    vendor = "sqlite"
+
+    def _match(self, query):
+        # Каждое слово - отдельная фраза с поиском по префиксу, так
+        # кавычки и операторы FTS из запроса не ломают выражение.
+        return " ".join(f'"{term}"*' for term in terms(query))
+
+    def _rows(self, **lookup):
+        posts = Post.objects.filter(**lookup).annotate(
+            search_author=Concat(
+                "author__username", Value(" "), "author__first_name",
+                Value(" "), "author__last_name", output_field=CharField()),
+            search_group=Coalesce(
+                "group__title", Value(""), output_field=CharField()),
+        ).order_by().values_list(
+            "pk", "text", "search_author", "search_group")
+        return posts.query.sql_with_params()
+
+    def index(self, **lookup):
+        """Переиндексирует посты, выбранные lookup."""
+        sql, params = self._rows(**lookup)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT OR REPLACE INTO {FTS_TABLE} "
+                f"(rowid, text, author, group_title) {sql}", params)
+
+    def remove(self, *pks):
+        placeholders = ", ".join(["%s"] * len(pks))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})",
+                pks)
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        self.index()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+
+    def filter(self, queryset, query):
+        if not terms(query):
+            return queryset.none()
+        # pk__in=RawSQL(...) Django оборачивает в лишние скобки, и
+        # подзапрос становится скалярным, поэтому условие целиком в SQL.
+        quote = connection.ops.quote_name
+        pk = f"{quote(Post._meta.db_table)}.{quote(Post._meta.pk.column)}"
+        return queryset.annotate(search_match=RawSQL(
+            f"{pk} IN (SELECT rowid FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH %s)",
+            (self._match(query),), output_field=BooleanField(),
+        )).filter(search_match=True)
+
+    def search(self, query, key=None, backwards=False, limit=10):
+        if not terms(query):
+            return []
+        # Меньший bm25 - более релевантный пост; при равенстве - новее.
+        sql = (
+            f"SELECT rowid AS post_id, bm25({FTS_TABLE}, %s, %s, %s) "
+            f"AS score FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s"
+        )
+        params = [*FTS_WEIGHTS, self._match(query)]
+        sql = f"SELECT score, post_id FROM ({sql})"
+        if key is not None:
+            after, before = (">", "<") if not backwards else ("<", ">")
+            sql += (
+                f" WHERE score {after} %s"
+                f" OR (score = %s AND post_id {before} %s)"
+            )
+            params += [key[0], key[0], key[1]]
+        if backwards:
+            sql += " ORDER BY score DESC, post_id ASC LIMIT %s"
+        else:
+            sql += " ORDER BY score ASC, post_id DESC LIMIT %s"
+        params.append(limit)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+
+@lru_cache(maxsize=None)
+def backend():
+    """Бэкенд из POST_SEARCH_BACKEND или LikeBackend для другой базы."""
+    backend_class = import_string(settings.POST_SEARCH_BACKEND)
+    vendor = getattr(backend_class, "vendor", None)
+    if vendor is not None and vendor != connection.vendor:
+        backend_class = LikeBackend
+    return backend_class()
+
+
+class SearchPaginator(CursorPaginator):
+    """Курсор по (ранг, pk): страницу выбирает бэкенд поиска.
+
+    object_list - посты, из которых берутся найденные записи, например
+    с select_related.
+    """
+
+    def __init__(self, object_list, per_page, query="", **kwargs):
+        super().__init__(
+            object_list, per_page, ordering=SEARCH_ORDERING, **kwargs)
+        self.query = query
+
+    def _field(self, name):
+        if name == "search_rank":
+            return FloatField()
+        return super()._field(name)
+
+    def fetch(self, key, backwards, limit):
+        found = backend().search(self.query, key, backwards, limit)
+        posts = self.object_list.order_by().in_bulk(
+            [pk for _, pk in found])
+        result = []
+        for rank, pk in found:
+            # Пост мог быть удален, а индекс еще не обновлен.
+            if pk in posts:
+                posts[pk].search_rank = rank
+                result.append(posts[pk])
+        return result
+
+    def get_page(self, number):
+        # Номеров страниц у поиска нет: ?page=N ведет на первую страницу.
+        return self.get_cursor_page(None)
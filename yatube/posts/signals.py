@@ -0,0 +1,151 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import (
+    autocomplete, cards, counters, feed_cache, leaderboard, search,
+    thumbnails, timeline, trending,
+)
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(pre_save, sender=User)
+@receiver(pre_save, sender=Group)
+def card_owner_before_save(sender, instance, raw=False, update_fields=None,
+                           **kwargs):
+    # Имя автора и группа выводятся в карточках постов: отмечаем их смену.
+    fields = cards.CARD_FIELDS[sender]
+    instance._card_changed = False
+    if raw or instance.pk is None:
+        return
+    if update_fields is not None and not set(update_fields) & set(fields):
+        return
+    previous = sender.objects.filter(pk=instance.pk).values_list(
+        *fields).first()
+    current = tuple(getattr(instance, name) for name in fields)
+    instance._card_changed = previous is not None and previous != current
+
+
+@receiver(post_save, sender=User)
+def author_cards_changed(sender, instance, **kwargs):
+    if getattr(instance, "_card_changed", False):
+        cards.touch(author=instance)
+        search.backend().index(author=instance)
+        feed_cache.bump("index", f"profile:{instance.pk}")
+
+
+@receiver(post_save, sender=Group)
+def group_cards_changed(sender, instance, **kwargs):
+    if getattr(instance, "_card_changed", False):
+        cards.touch(group=instance)
+        search.backend().index(group=instance)
+        feed_cache.bump("index")
+
+
+@receiver(post_save, sender=Group)
+def group_page_changed(sender, instance, created, raw=False, **kwargs):
+    # Заголовок и описание есть только на странице группы: любая правка
+    # меняет ее кэш и Last-Modified, даже если карточки прежние.
+    if not created and not raw:
+        feed_cache.bump(f"group:{instance.pk}")
+
+
+@receiver(post_save, sender=User)
+def user_autocomplete(sender, instance, created, raw=False, **kwargs):
+    # Подсказки выводят логин и имя, как и карточки.
+    if not raw and (created or getattr(instance, "_card_changed", False)):
+        autocomplete.user_changed(instance)
+
+
+@receiver(post_save, sender=Group)
+def group_autocomplete(sender, instance, created, raw=False, **kwargs):
+    if not raw and (created or getattr(instance, "_card_changed", False)):
+        autocomplete.group_changed(instance)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    autocomplete.changed("user", instance.pk)
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    autocomplete.changed("group", instance.pk)
+
+
+@receiver(pre_save, sender=Post)
+def post_before_save(sender, instance, raw=False, **kwargs):
+    # Запоминаем прежние группу и картинку, чтобы сбросить кэш лент
+    # группы и построить превью только новой картинки.
+    instance._previous_group_ids = ()
+    instance._previous_image = None
+    if instance.pk and not raw:
+        previous = Post.objects.filter(pk=instance.pk).values_list(
+            "group_id", "image").first()
+        if previous is not None:
+            instance._previous_group_ids = previous[:1]
+            instance._previous_image = previous[1]
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    if created:
+        counters.bump(instance.author_id, posts_count=1)
+        timeline.fan_out(instance)
+    image = instance.image.name
+    if image and not raw and image != getattr(
+            instance, "_previous_image", None):
+        transaction.on_commit(lambda: thumbnails.schedule(image))
+    if not raw:
+        search.backend().index(pk=instance.pk)
+    feed_cache.bump(*feed_cache.post_scopes(
+        instance, getattr(instance, "_previous_group_ids", ())))
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.bump(instance.author_id, posts_count=-1)
+    search.backend().remove(instance.pk)
+    feed_cache.bump(*feed_cache.post_scopes(instance))
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.bump(instance.author_id, followers_count=1)
+        counters.bump(instance.user_id, following_count=1)
+        timeline.backfill(instance.user_id, instance.author_id)
+        feed_cache.touch(
+            f"profile:{instance.author_id}", f"profile:{instance.user_id}")
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.bump(instance.author_id, followers_count=-1)
+    counters.bump(instance.user_id, following_count=-1)
+    timeline.prune(instance.user_id, instance.author_id)
+    feed_cache.touch(
+        f"profile:{instance.author_id}", f"profile:{instance.user_id}")
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        leaderboard.comment_added(instance.post_id)
+    feed_cache.bump(*feed_cache.post_scopes(instance.post))
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    leaderboard.comment_removed(instance.post_id)
+    trending.comment_removed(instance.post_id, instance.created)
+    # Пост может удаляться каскадом вместе с комментарием.
+    post = Post.objects.filter(pk=instance.post_id).first()
+    if post is not None:
+        feed_cache.bump(*feed_cache.post_scopes(post))
@@ -0,0 +1,76 @@
+"""Хранилище картинок постов, адресуемое по содержимому.
+
+Файл называется sha256 своего содержимого и лежит в подкаталогах по
+первым символам хеша внутри каталога upload_to: posts/ab/cd/abcd....jpg.
+Одинаковые картинки хранятся один раз, а каталоги не разрастаются до
+миллионов файлов.
+"""
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+CONTENT_NAME_RE = re.compile(
+    r"(^|/)([0-9a-f]{2})/([0-9a-f]{2})/\2\3[0-9a-f]{60}(\.\w+)?$")
+
+
+def content_name(name, content):
+    """Имя по хешу содержимого в каталоге name, с расширением из name."""
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    digest = digest.hexdigest()
+    extension = os.path.splitext(name)[1].lower()
+    return posixpath.join(
+        posixpath.dirname(name), digest[:2], digest[2:4], digest + extension)
+
+
+def is_content_name(name):
+    """Лежит ли файл уже по адресу своего содержимого."""
+    return bool(CONTENT_NAME_RE.search(name))
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Сохраняет файл под именем по хешу и не дублирует одинаковые."""
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        return super().save(
+            content_name(name, content), content, max_length=max_length)
+
+    def get_available_name(self, name, max_length=None):
+        # Файл с таким именем уже хранит это же содержимое.
+        return name
+
+    def _save(self, name, content):
+        full_path = self.path(name)
+        if os.path.exists(full_path):
+            return name
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        # Пишем во временный файл и переименовываем: параллельная загрузка
+        # той же картинки заменит файл таким же содержимым.
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as temp_file:
+                for chunk in content.chunks():
+                    temp_file.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(temp_path, self.file_permissions_mode)
+            os.replace(temp_path, full_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        return name
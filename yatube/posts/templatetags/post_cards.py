@@ -0,0 +1,11 @@
+from django import template
+
+from ..cards import render_cards
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_cards(posts):
+    """Готовые карточки постов страницы: {% post_cards page_obj as cards %}."""
+    return render_cards(posts)
@@ -0,0 +1,196 @@
+import json
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from .. import storage, thumbnails
+from ..models import Comment, Post, TimelineEntry
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b"\x47\x49\x46\x38\x39\x61\x01\x00\x01\x00\x00\x00\x00\x21\xf9\x04"
+    b"\x01\x0a\x00\x01\x00\x2c\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02"
+    b"\x02\x4c\x01\x00\x3b"
+)
+
+
+class ImportTest(TestCase):
+    """Массовая загрузка командой import_yatube."""
+    ROWS = [
+        {"type": "user", "username": "legacy", "first_name": "Лев"},
+        {"type": "group", "slug": "old", "title": "Старая группа"},
+        {"type": "post", "id": 500, "author": "legacy", "group": "old",
+         "text": "Пост из архива", "pub_date": "2015-03-01T10:00:00"},
+        {"type": "comment", "post": 500, "author": "reader",
+         "text": "Старый комментарий", "created": "2015-03-02T10:00:00"},
+        {"type": "follow", "user": "reader", "author": "legacy"},
+        {"type": "post", "author": "nobody", "text": "Без автора"},
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username="reader")
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, "data.jsonl")
+
+    def write(self, rows):
+        with open(self.path, "w") as file:
+            for row in rows:
+                file.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+    def run_import(self, *args):
+        call_command(
+            "import_yatube", self.path, "--chunk-size", "2", *args,
+            stdout=StringIO(), stderr=StringIO())
+
+    def test_import(self):
+        """Ссылки разрешаются по именам, даты и pk берутся из файла."""
+        self.write(self.ROWS)
+        self.run_import()
+        post = Post.objects.get(pk=500)
+        self.assertEqual(post.author.username, "legacy")
+        self.assertEqual(post.group.slug, "old")
+        self.assertEqual(post.pub_date.year, 2015)
+        comment = Comment.objects.get(post=post)
+        self.assertEqual(comment.author, self.reader)
+        self.assertEqual(comment.created.year, 2015)
+        self.assertFalse(Post.objects.filter(text="Без автора").exists())
+        self.assertEqual(post.author.stats.posts_count, 1)
+        self.assertEqual(post.author.stats.followers_count, 1)
+        self.assertEqual(Post.objects.get(pk=500).comment_count, 1)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=post).exists())
+        self.assertFalse(os.path.exists(self.path + ".checkpoint"))
+
+    def test_resume_after_failure(self):
+        """Повторный запуск продолжает с последней загруженной порции."""
+        broken = [dict(row) for row in self.ROWS]
+        broken[3]["created"] = "вчера"
+        self.write(broken)
+        with self.assertRaises(CommandError):
+            self.run_import()
+        self.assertTrue(User.objects.filter(username="legacy").exists())
+        self.assertFalse(Post.objects.filter(pk=500).exists())
+        with open(self.path + ".checkpoint") as file:
+            self.assertEqual(json.load(file)["rows"], 2)
+        # Первые строки уже загружены: checkpoint их пропускает.
+        self.write([{"type": "user"}] * 2 + self.ROWS[2:])
+        self.run_import()
+        self.assertEqual(User.objects.filter(username="legacy").count(), 1)
+        self.assertEqual(Comment.objects.get().created.year, 2015)
+
+    def test_malformed_line(self):
+        """Неверный JSON - ошибка команды с номером строки файла."""
+        self.write(self.ROWS[:2])
+        with open(self.path, "a") as file:
+            file.write("\n{broken\n")
+        with self.assertRaisesMessage(CommandError, "Строка 4:"):
+            self.run_import()
+        with open(self.path + ".checkpoint") as file:
+            self.assertEqual(json.load(file)["rows"], 2)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ContentStorageTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="storage")
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, name):
+        return Post.objects.create(
+            author=self.user,
+            text=name,
+            image=SimpleUploadedFile(name, SMALL_GIF, "image/gif"),
+        )
+
+    def test_same_content_stored_once(self):
+        """Одинаковые картинки получают одно имя по хешу содержимого."""
+        first = self.create_post("first.gif")
+        second = self.create_post("second.GIF")
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(storage.is_content_name(first.image.name))
+        self.assertTrue(first.image.name.endswith(".gif"))
+        directory = os.path.dirname(first.image.path)
+        self.assertEqual(os.listdir(directory), [os.path.basename(
+            first.image.name)])
+
+    def test_relocate_command(self):
+        """Команда переносит старые файлы в хранилище по хешу."""
+        field_storage = Post._meta.get_field("image").storage
+        old_name = FileSystemStorage().save(
+            "posts/legacy.gif", ContentFile(SMALL_GIF))
+        post = self.create_post("new.gif")
+        Post.objects.filter(pk=post.pk).update(image=old_name)
+        call_command("relocate_images", "--delete-old", stdout=StringIO())
+        post.refresh_from_db()
+        self.assertTrue(storage.is_content_name(post.image.name))
+        self.assertEqual(post.image.read(), SMALL_GIF)
+        self.assertFalse(field_storage.exists(old_name))
+
+    def test_relocate_shared_old_name(self):
+        """Старый файл нескольких постов удаляется после переноса всех."""
+        old_name = FileSystemStorage().save(
+            "posts/shared.gif", ContentFile(SMALL_GIF))
+        posts = [self.create_post(name) for name in ("a.gif", "b.gif")]
+        Post.objects.filter(pk__in=[post.pk for post in posts]).update(
+            image=old_name)
+        call_command(
+            "relocate_images", "--delete-old", "--batch-size", "1",
+            stdout=StringIO(), stderr=StringIO())
+        for post in posts:
+            post.refresh_from_db()
+            self.assertTrue(storage.is_content_name(post.image.name))
+            self.assertEqual(post.image.read(), SMALL_GIF)
+        field_storage = Post._meta.get_field("image").storage
+        self.assertFalse(field_storage.exists(old_name))
+
+    def test_collect_media_garbage(self):
+        """Сборщик мусора удаляет картинки удаленных постов и их превью."""
+        png = BytesIO()
+        Image.new("RGB", (2, 2), "red").save(png, "PNG")
+        kept = self.create_post("kept.gif")
+        removed = Post.objects.create(
+            author=self.user,
+            text="removed",
+            image=SimpleUploadedFile("removed.png", png.getvalue()),
+        )
+        previews = {}
+        for post in (kept, removed):
+            thumbnails.generate(post.image.name)
+            source = thumbnails.source_file(post.image.name)
+            previews[post.text] = [
+                thumbnails.backend.thumbnail_file(source, geometry, **options)
+                for _, geometry, options in thumbnails._all_variants()
+            ]
+        removed_path = removed.image.path
+        removed.delete()
+        options = {"min_age": 0, "pause": 0, "stdout": StringIO()}
+        call_command("collect_media_garbage", "--dry-run", **options)
+        self.assertTrue(os.path.exists(removed_path))
+        call_command("collect_media_garbage", **options)
+        self.assertFalse(os.path.exists(removed_path))
+        self.assertTrue(os.path.exists(kept.image.path))
+        for thumbnail in previews["removed"]:
+            self.assertFalse(thumbnail.exists())
+        for thumbnail in previews["kept.gif"]:
+            self.assertTrue(thumbnail.exists())
+        self.assertIsNotNone(thumbnails.picture(kept.image, "card"))
@@ -1,11 +1,13 @@
 import shutil
 import tempfile
+from io import BytesIO
 
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.contrib.auth import get_user_model
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 from ..models import Post, Group, Comment
 from http import HTTPStatus
 from django.core.cache import cache
@@ -144,3 +146,76 @@ class TestPostForm(TestCase):
             ).exists(),
         )
         self.assertEqual(response.status_code, HTTPStatus.OK)
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    POST_IMAGE_MAX_SIDE=100,
+    POST_IMAGE_MAX_PIXELS=200 * 200,
+    POST_IMAGE_MAX_BYTES=64 * 1024,
+)
+class TestPostImageUpload(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username="uploader")
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def upload(self, size, exif=None, name="photo.jpg", truncate=False):
+        data = BytesIO()
+        options = {"exif": exif.tobytes()} if exif else {}
+        Image.effect_noise(size, 64).convert("RGB").save(
+            data, "JPEG", **options)
+        content = data.getvalue()
+        if truncate:
+            content = content[:len(content) // 2]
+        image = SimpleUploadedFile(name, content, "image/jpeg")
+        return self.client.post(
+            reverse("posts:post_create"),
+            data={"text": name, "image": image},
+        )
+
+    def test_large_image_downscaled_without_exif(self):
+        """Большая картинка уменьшается, EXIF с нее снимается."""
+        exif = Image.Exif()
+        exif[0x010F] = "Camera"  # Производитель камеры.
+        exif[0x0112] = 6  # Повернуто на 90 градусов.
+        self.upload((180, 120), exif)
+        post = Post.objects.get(text="photo.jpg")
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (67, 100))
+            self.assertNotIn("exif", image.info)
+
+    def test_small_image_kept(self):
+        """Картинка в пределах лимитов сохраняется без перекодирования."""
+        self.upload((50, 40))
+        post = Post.objects.get(text="photo.jpg")
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (50, 40))
+
+    def test_limits_rejected_before_decoding(self):
+        """Слишком много пикселей или байт - ошибка формы."""
+        for size in ((300, 300), (500, 100)):
+            with self.subTest(size=size):
+                response = self.upload(size)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertTrue(response.context["form"].errors["image"])
+        with override_settings(POST_IMAGE_MAX_BYTES=100):
+            response = self.upload((50, 40))
+        self.assertTrue(response.context["form"].errors["image"])
+        self.assertFalse(Post.objects.exists())
+
+    def test_truncated_image_rejected(self):
+        """Оборванная большая картинка - ошибка формы, а не 500."""
+        response = self.upload((180, 120), truncate=True)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertTrue(response.context["form"].errors["image"])
+        self.assertFalse(Post.objects.exists())
@@ -1,5 +1,12 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
 from django.test import TestCase
-from ..models import Post, Group
+from django.urls import reverse
+from django.utils import timezone
+from .. import leaderboard, trending
+from ..models import Comment, Follow, Post, PostScore, Group, UserStats
 from django.contrib.auth import get_user_model
 
 
@@ -58,3 +65,137 @@ class PostModelTest(TestCase):
                 self.assertEqual(
                     post._meta.get_field(value).help_text, expected
                 )
+
+
+class LeaderboardTest(TestCase):
+    """Счётчик комментариев поста и лучший пост."""
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="commentator")
+        cls.post = Post.objects.create(author=cls.user, text="Обычный пост")
+        cls.popular = Post.objects.create(author=cls.user, text="Популярный")
+
+    def test_comment_count_follows_comments(self):
+        """Создание и удаление комментария меняют comment_count."""
+        comment = Comment.objects.create(
+            post=self.popular, author=self.user, text="Первый")
+        Comment.objects.create(post=self.popular, author=self.user, text="2")
+        self.popular.refresh_from_db()
+        self.assertEqual(self.popular.comment_count, 2)
+        self.assertEqual(
+            leaderboard.leaderboard_posts().order_by(
+                *leaderboard.LEADERBOARD_ORDERING).first(),
+            self.popular
+        )
+        comment.delete()
+        self.popular.refresh_from_db()
+        self.assertEqual(self.popular.comment_count, 1)
+
+    def test_rebuild_leaderboard(self):
+        """Команда пересчитывает счётчики с нуля."""
+        Comment.objects.create(post=self.post, author=self.user, text="Да")
+        Post.objects.update(comment_count=7)
+        call_command("rebuild_leaderboard", stdout=StringIO())
+        self.assertEqual(
+            dict(Post.objects.values_list("pk", "comment_count")),
+            {self.post.pk: 1, self.popular.pk: 0}
+        )
+
+
+class TrendingTest(TestCase):
+    """Рейтинг постов в окнах с затуханием."""
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="reader")
+        cls.old = Post.objects.create(author=cls.user, text="Вчерашний")
+        cls.fresh = Post.objects.create(author=cls.user, text="Свежий")
+        cls.now = timezone.now()
+
+    def comment(self, post, hours_ago):
+        comment = Comment.objects.create(
+            post=post, author=self.user, text="Комментарий")
+        Comment.objects.filter(pk=comment.pk).update(
+            created=self.now - timedelta(hours=hours_ago))
+
+    def scores(self, window):
+        return dict(PostScore.objects.filter(
+            window=window).values_list("post", "score"))
+
+    def test_day_window_skips_old_comments(self):
+        """В рейтинг дня попадают только комментарии за сутки."""
+        self.comment(self.old, 30)
+        self.comment(self.old, 30)
+        self.comment(self.fresh, 1)
+        trending.update_window("day", now=self.now)
+        self.assertEqual(list(self.scores("day")), [self.fresh.pk])
+        self.assertEqual(trending.best_post("day"), self.fresh)
+        call_command("update_trending", stdout=StringIO())
+        response = self.client.get(reverse("posts:trending"))
+        self.assertEqual(
+            response.context["page_obj"].object_list, [self.fresh])
+
+    def test_incremental_update_matches_full(self):
+        """Пересчет по приращению совпадает с полным пересчетом."""
+        self.comment(self.old, 20)
+        self.comment(self.fresh, 2)
+        trending.update_window("day", now=self.now)
+        self.comment(self.fresh, -3)
+        later = self.now + timedelta(hours=5)
+        trending.update_window("day", now=later)
+        incremental = self.scores("day")
+        trending.update_window("day", now=later, full=True)
+        full = self.scores("day")
+        self.assertEqual(incremental.keys(), full.keys())
+        for post_id, score in full.items():
+            self.assertAlmostEqual(incremental[post_id], score)
+
+    def test_deleted_comment_subtracted(self):
+        """Удаленный комментарий сразу уходит из рейтинга."""
+        self.comment(self.fresh, 2)
+        self.comment(self.fresh, 1)
+        self.comment(self.old, 3)
+        trending.update_window("day", now=self.now)
+        Comment.objects.filter(post=self.old).delete()
+        Comment.objects.filter(post=self.fresh).earliest("pk").delete()
+        self.assertNotIn(self.old.pk, self.scores("day"))
+        later = self.now + timedelta(hours=1)
+        trending.update_window("day", now=later)
+        incremental = self.scores("day")
+        trending.update_window("day", now=later, full=True)
+        self.assertEqual(incremental.keys(), {self.fresh.pk})
+        self.assertAlmostEqual(
+            incremental[self.fresh.pk], self.scores("day")[self.fresh.pk])
+
+
+class UserStatsTest(TestCase):
+    """Денормализованные счетчики пользователя."""
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username="writer")
+        cls.reader = User.objects.create_user(username="reader")
+
+    def stats(self, user):
+        return UserStats.objects.values_list(
+            "posts_count", "followers_count", "following_count"
+        ).get(user=user)
+
+    def test_counters_follow_changes(self):
+        """Посты и подписки меняют счетчики автора и подписчика."""
+        post = Post.objects.create(author=self.author, text="Пост")
+        Post.objects.create(author=self.author, text="Еще пост")
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.stats(self.author), (2, 1, 0))
+        self.assertEqual(self.stats(self.reader), (0, 0, 1))
+        post.delete()
+        follow.delete()
+        self.assertEqual(self.stats(self.author), (1, 0, 0))
+        self.assertEqual(self.stats(self.reader), (0, 0, 0))
+
+    def test_repair_counters(self):
+        """Команда исправляет разошедшиеся и недостающие счетчики."""
+        Post.objects.create(author=self.author, text="Пост")
+        UserStats.objects.filter(user=self.author).update(posts_count=5)
+        UserStats.objects.filter(user=self.reader).delete()
+        call_command("repair_counters", stdout=StringIO())
+        self.assertEqual(self.stats(self.author), (1, 0, 0))
+        self.assertEqual(self.stats(self.reader), (0, 0, 0))
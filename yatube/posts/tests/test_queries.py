@@ -0,0 +1,73 @@
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+@skipUnless(connection.vendor == "sqlite", "EXPLAIN QUERY PLAN из SQLite")
+class FeedQueryPlanTest(TestCase):
+    """Запросы лент читают страницу по индексу, без временной сортировки."""
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username="planner")
+        cls.reader = User.objects.create_user(username="plan_reader")
+        cls.group = Group.objects.create(
+            title="Группа", slug="plan", description="Описание")
+        for number in range(15):
+            cls.post = Post.objects.create(
+                author=cls.author, group=cls.group, text=f"Пост {number}")
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text="Комментарий")
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def query_plans(self, url):
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(url)
+        plans = {}
+        with connection.cursor() as cursor:
+            for query in context.captured_queries:
+                sql = query["sql"]
+                if not sql.startswith("SELECT") or "ORDER BY" not in sql:
+                    continue
+                cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+                plans[sql] = " | ".join(row[-1] for row in cursor.fetchall())
+        return plans
+
+    def test_views_use_indexes(self):
+        """Главный запрос каждой страницы идет по индексу без B-TREE."""
+        main_tables = {
+            reverse("posts:index"): "posts_post",
+            reverse("posts:group_list", args=[self.group.slug]):
+                "posts_post",
+            reverse("posts:profile", args=[self.author.username]):
+                "posts_post",
+            reverse("posts:follow_index"): "posts_timelineentry",
+            reverse("posts:post_detail", args=[self.post.pk]):
+                "posts_comment",
+            reverse("posts:trending") + "?window=all": "posts_post",
+        }
+        for url, table in main_tables.items():
+            with self.subTest(url=url):
+                plans = self.query_plans(url)
+                main = [
+                    plan for sql, plan in plans.items()
+                    if f'FROM "{table}"' in sql or f'JOIN "{table}"' in sql
+                ]
+                self.assertTrue(main, f"Нет запроса к {table}")
+                for plan in main:
+                    self.assertIn("INDEX", plan)
+                for plan in plans.values():
+                    self.assertNotIn("TEMP B-TREE", plan)
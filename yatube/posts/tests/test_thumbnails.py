@@ -0,0 +1,112 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.template.loader import render_to_string
+from django.test import TestCase, override_settings
+from PIL import Image
+from sorl.thumbnail import default, get_thumbnail
+
+from .. import thumbnails
+from ..models import Post
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b"\x47\x49\x46\x38\x39\x61\x01\x00\x01\x00\x00\x00\x00\x21\xf9\x04"
+    b"\x01\x0a\x00\x01\x00\x2c\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02"
+    b"\x02\x4c\x01\x00\x3b"
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailFormatsTest(TestCase):
+    """Варианты превью в дополнительных форматах для <source>."""
+    @classmethod
+    def setUpTestData(cls):
+        cls.post = Post.objects.create(
+            author=User.objects.create_user(username="formats"),
+            text="Пост с картинкой",
+            image=SimpleUploadedFile("small.gif", SMALL_GIF, "image/gif"),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def pictures(self, formats):
+        """Данные <picture>, как будто все превью в formats построены."""
+        def lookup_many(planned):
+            return {
+                thumbnail.key: mock.Mock(url=f"/{thumbnail.name}", width=1)
+                for thumbnail in planned
+            }
+
+        with mock.patch.object(
+                thumbnails, "supported_formats", return_value=formats), \
+                mock.patch.object(thumbnails, "lookup_many", lookup_many):
+            return thumbnails.picture(self.post.image, "card")
+
+    def test_names_match_sorl(self):
+        """Имена превью совпадают с теми, что строит сам sorl."""
+        source = thumbnails.source_file(self.post.image.name)
+        with mock.patch.object(
+                thumbnails, "supported_formats",
+                return_value=("AVIF", "WEBP")), \
+                mock.patch.object(
+                    default.kvstore.__class__, "get",
+                    lambda kvstore, thumbnail: thumbnail):
+            for preset in settings.THUMBNAIL_PRESETS:
+                for format_, size, options in thumbnails.variants(preset):
+                    with self.subTest(preset=preset, format=format_,
+                                      size=size):
+                        self.assertEqual(
+                            thumbnails.backend.thumbnail_file(
+                                source, size, **options).name,
+                            get_thumbnail(source, size, **options).name)
+
+    def test_unknown_format_type_skipped(self):
+        """Формат без известного MIME-типа не дает <source>."""
+        picture = self.pictures(("WEBP", "BOGUS"))
+        self.assertEqual(
+            [source["type"] for source in picture["sources"]],
+            ["image/webp"])
+
+    @override_settings(THUMBNAIL_SRCSET_FORMATS=("AVIF", "WEBP"))
+    def test_formats_pillow_cannot_save_skipped(self):
+        """Строятся только форматы, которые установленный Pillow пишет."""
+        Image.init()
+        saved = {format_: Image.SAVE.pop(format_, None)
+                 for format_ in ("AVIF", "WEBP")}
+        thumbnails.supported_formats.cache_clear()
+        self.addCleanup(thumbnails.supported_formats.cache_clear)
+        try:
+            self.assertEqual(thumbnails.supported_formats(), ())
+            Image.SAVE["WEBP"] = mock.Mock()
+            thumbnails.supported_formats.cache_clear()
+            self.assertEqual(thumbnails.supported_formats(), ("WEBP",))
+            self.assertIn("WEBP", {
+                format_ for format_, *_ in thumbnails.variants("card")})
+        finally:
+            Image.SAVE.pop("WEBP", None)
+            Image.SAVE.update({
+                format_: save for format_, save in saved.items() if save
+            })
+
+    def test_modern_format_sources_rendered(self):
+        """AVIF и WEBP попадают в <source> перед запасным <img>."""
+        picture = self.pictures(("AVIF", "WEBP"))
+        self.assertEqual(
+            [source["type"] for source in picture["sources"]],
+            ["image/avif", "image/webp"])
+        self.assertIn(".avif 1w", picture["sources"][0]["srcset"])
+        html = render_to_string("includes/post_image.html", {
+            "image": self.post.image, "picture": picture})
+        self.assertLess(
+            html.index('<source type="image/avif"'),
+            html.index('<source type="image/webp"'))
+        self.assertLess(html.index("<source"), html.index("<img"))
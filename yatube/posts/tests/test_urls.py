@@ -40,6 +40,8 @@ class PostsURLTest(TestCase):
             f"/group/{self.group.slug}/": HTTPStatus.OK,
             f"/profile/{self.author_user}/": HTTPStatus.OK,
             f"/posts/{self.post.id}/": HTTPStatus.OK,
+            "/trending/": HTTPStatus.OK,
+            "/trending/?window=all": HTTPStatus.OK,
             "unexisting_page/": HTTPStatus.NOT_FOUND,
         }
         for url, status_code in page_url_names.items():
@@ -88,6 +90,7 @@ class PostsURLTest(TestCase):
             f"/posts/{self.post.id}/": "posts/post_detail.html",
             f"/posts/{self.post.id}/edit/": "posts/post_create.html",
             "/create/": "posts/post_create.html",
+            "/trending/": "posts/trending.html",
         }
         for url, template in templates_url_names.items():
             with self.subTest(url=url):
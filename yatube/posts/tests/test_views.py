@@ -1,13 +1,25 @@
+import json
 import tempfile
+import time
 import shutil
+import zipfile
+from io import BytesIO
+from unittest import mock
+from http import HTTPStatus
 from django.core.cache import cache
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django import forms
-from ..models import Follow, Post, Group
+from core import metrics
+from .. import autocomplete, thumbnails, timeline
+from ..models import Comment, Follow, Post, Group, TimelineEntry, UserStats
+from ..views import COMMENTS_PER_PAGE, SORT_VALUE
+from django.db import IntegrityError, connection, transaction
 from django.db.models import Count
 
 
@@ -15,7 +27,8 @@ User = get_user_model()
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+# Превью строятся в процессе теста, а не в пуле.
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
 class PostsPagesTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -31,6 +44,7 @@ class PostsPagesTests(TestCase):
             b'\x00\x00\x01\x00\x01\x00\x00\x02'
             b'\x02\x4c\x01\x00\x3b'
         )
+        cls.small_gif = small_gif
         uploaded = SimpleUploadedFile(
             name='small.gif',
             content=small_gif,
@@ -60,6 +74,84 @@ class PostsPagesTests(TestCase):
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
 
+    def test_thumbnails_built_after_save(self):
+        """До построения превью видна исходная картинка, после - превью."""
+        url = reverse("posts:post_detail", args=[self.post.pk])
+        response = self.authorized_client.get(url)
+        self.assertContains(response, self.post.image.url)
+        self.assertIsNone(thumbnails.preset_thumbnail(self.post.image, "card"))
+        thumbnails.schedule(self.post.image.name)
+        for preset in settings.THUMBNAIL_PRESETS:
+            with self.subTest(preset=preset):
+                self.assertIsNotNone(
+                    thumbnails.preset_thumbnail(self.post.image, preset))
+        detail = thumbnails.preset_thumbnail(self.post.image, "detail")
+        response = self.authorized_client.get(url)
+        self.assertContains(response, detail.url)
+        self.assertNotContains(response, self.post.image.url)
+
+    @override_settings(THUMBNAIL_WORKERS=2)
+    def test_thumbnails_queued_to_pool(self):
+        """По умолчанию превью уходят в пул, а не строятся в запросе."""
+        submitted = []
+
+        class Pool:
+            def submit(self, function, *args):
+                submitted.append((function, args))
+                return self
+
+            def add_done_callback(self, callback):
+                pass
+
+        previous, thumbnails._executor = thumbnails._executor, Pool()
+        try:
+            thumbnails.schedule(self.post.image.name)
+        finally:
+            thumbnails._executor = previous
+        self.assertEqual(len(submitted), 1)
+        self.assertEqual(submitted[0][1], (self.post.image.name,))
+        self.assertIsNone(thumbnails.preset_thumbnail(self.post.image, "card"))
+
+    def test_responsive_variants(self):
+        """Карточка получает srcset с уменьшенными копиями превью."""
+        thumbnails.schedule(self.post.image.name)
+        response = self.authorized_client.get(reverse("posts:index"))
+        srcset = thumbnails.picture(self.post.image, "card")["srcset"]
+        for width in (*settings.THUMBNAIL_SRCSET_WIDTHS, 1920):
+            with self.subTest(width=width):
+                self.assertIn(f" {width}w", srcset)
+        self.assertContains(response, f'srcset="{srcset}"')
+        self.assertEqual(
+            thumbnails._widths("960x280"), ["480x140", "960x280"])
+        self.assertEqual(thumbnails._widths("x369"), ["x369"])
+
+    def test_thumbnails_resolved_in_one_query(self):
+        """Превью всех карточек страницы ищутся одним запросом."""
+        posts = [self.post] + [
+            Post.objects.create(
+                text=f"Пост с картинкой {number}",
+                author=self.user,
+                image=SimpleUploadedFile(
+                    f"extra{number}.gif", self.small_gif, "image/gif"),
+            )
+            for number in range(3)
+        ]
+        for post in posts:
+            thumbnails.schedule(post.image.name)
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.authorized_client.get(reverse("posts:index"))
+        kvstore_queries = [
+            query for query in context.captured_queries
+            if "thumbnail_kvstore" in query["sql"]
+        ]
+        self.assertEqual(len(kvstore_queries), 1)
+        for post in posts:
+            with self.subTest(post=post.pk):
+                self.assertContains(
+                    response,
+                    thumbnails.picture(post.image, "card")["src"])
+
     def test_page_and_templates(self):
         """URL-адрес использует соответствующий шаблон."""
         templates_pages_name = {
@@ -166,25 +258,58 @@ class TestCaches(TestCase):
         cache.clear()
 
     def test_index_page_cache(self):
-        """Проверка хранения кэша на главной странице index."""
-        response = self.authorized_client.get(reverse("posts:index"))
-        posts = response.content
-        # Для отсувствия конфликта тестовых записей, создадим еще один пост.
+        """Главная страница берется из кэша, пока ленты не менялись."""
         Post.objects.create(
             text="Тестовый текст тестируемого кэша.",
             author=self.user,
         )
-        response_for_last_post = self.authorized_client.get(
-            reverse("posts:index")
-        )
-        last_post = response_for_last_post.content
-        self.assertEqual(last_post, posts)
-        cache.clear()
-        response_new_post = self.authorized_client.get(
-            reverse("posts:index")
+        posts = self.authorized_client.get(reverse("posts:index")).content
+        # Изменение в обход сигналов не сбрасывает кэш.
+        Post.objects.update(text="Текст, измененный без сигналов.")
+        cached = self.authorized_client.get(reverse("posts:index")).content
+        self.assertEqual(cached, posts)
+
+    def test_new_post_invalidates_feeds(self):
+        """Новый пост сразу виден на закэшированных лентах."""
+        group = Group.objects.create(
+            title="Группа кэша", slug="cache_slug", description="Описание")
+        urls = (
+            reverse("posts:index"),
+            reverse("posts:group_list", kwargs={"slug": group.slug}),
+            reverse("posts:profile", kwargs={"username": self.user}),
         )
-        new_post = response_new_post.content
-        self.assertNotEqual(last_post, new_post)
+        for url in urls:
+            self.authorized_client.get(url)
+        Post.objects.create(
+            text="Пост после кэширования.", author=self.user, group=group)
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                self.assertContains(response, "Пост после кэширования.")
+
+    def test_post_card_cached_until_updated(self):
+        """Карточка поста общая для лент и меняется с updated_at."""
+        post = Post.objects.create(text="Первая версия", author=self.user)
+        self.authorized_client.get(reverse("posts:index"))
+        # Правка в обход save() не трогает updated_at: профиль еще не
+        # кэширован, но берет готовую карточку, отрисованную для главной.
+        Post.objects.update(text="Правка без сохранения")
+        url = reverse("posts:profile", kwargs={"username": self.user})
+        self.assertContains(self.authorized_client.get(url), "Первая версия")
+        post.refresh_from_db()
+        post.text = "Вторая версия"
+        post.save()
+        self.assertContains(self.authorized_client.get(url), "Вторая версия")
+
+    def test_author_rename_redraws_cards(self):
+        """Новое имя автора сразу видно в карточках его постов."""
+        Post.objects.create(text="Пост автора", author=self.user)
+        self.authorized_client.get(reverse("posts:index"))
+        self.user.first_name = "Переименованный"
+        self.user.save()
+        self.assertContains(
+            self.authorized_client.get(reverse("posts:index")),
+            "Переименованный")
 
 
 class PaginatorViewsTest(TestCase):
@@ -245,6 +370,28 @@ class PaginatorViewsTest(TestCase):
                 self.assertEqual(len(
                     response.context.get('page_obj').object_list), expected)
 
+    def test_cursor_pages(self):
+        """Курсоры ведут на следующую и обратно на предыдущую страницу."""
+        url = reverse("posts:index")
+        first = self.guest_client.get(url).context["page_obj"]
+        self.assertIsNone(first.previous_cursor)
+        second = self.guest_client.get(
+            url, {"cursor": first.next_cursor}).context["page_obj"]
+        self.assertEqual(len(second.object_list), 3)
+        self.assertIsNone(second.next_cursor)
+        back = self.guest_client.get(
+            url, {"cursor": second.previous_cursor}).context["page_obj"]
+        self.assertEqual(back.object_list, first.object_list)
+        self.assertIsNone(back.previous_cursor)
+
+    def test_broken_cursor_shows_first_page(self):
+        """Битый курсор открывает первую страницу."""
+        response = self.guest_client.get(
+            reverse("posts:index"), {"cursor": "не-курсор"})
+        self.assertEqual(
+            response.context["page_obj"].object_list,
+            list(Post.objects.all()[:10]))
+
 
 class TestFollow(TestCase):
     @classmethod
@@ -259,6 +406,7 @@ class TestFollow(TestCase):
         )
 
     def setUp(self):
+        cache.clear()
         self.author_following_client = Client()
         self.author_following_client.force_login(self.author_following)
         self.user_follower_client = Client()
@@ -294,6 +442,46 @@ class TestFollow(TestCase):
         )
         self.assertEqual(Follow.objects.all().count(), 0)
 
+    def test_follow_is_idempotent(self):
+        # Повторная подписка не создает дубликатов.
+        follow_url = reverse(
+            "posts:profile_follow",
+            kwargs={"username": self.author_following.username}
+        )
+        self.user_follower_client.get(follow_url)
+        response = self.user_follower_client.get(follow_url)
+        self.assertRedirects(
+            response,
+            reverse(
+                "posts:profile",
+                kwargs={"username": self.author_following.username}
+            )
+        )
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author_following).followers_count,
+            1
+        )
+
+    def test_follow_constraints(self):
+        # База сама не дает подписаться дважды или на себя.
+        Follow.objects.create(
+            user=self.user_follower, author=self.author_following)
+        for user, author in (
+            (self.user_follower, self.author_following),
+            (self.user_follower, self.user_follower),
+        ):
+            with self.subTest(author=author), self.assertRaises(
+                    IntegrityError), transaction.atomic():
+                Follow.objects.create(user=user, author=author)
+
+    def test_follow_unknown_user(self):
+        # Подписка на несуществующего пользователя - 404, а не 500.
+        response = self.user_follower_client.get(
+            reverse("posts:profile_follow", kwargs={"username": "nobody"})
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
     def test_follow_page(self):
         # Проверяем отображение страницы с подписками на автора.
         Follow.objects.create(
@@ -306,3 +494,418 @@ class TestFollow(TestCase):
         post_test_follower = response.context["page_obj"][0]
         post_text_follower = post_test_follower.text
         self.assertEqual(post_text_follower, "Текст для проверки подписок.")
+
+    def test_timeline_fan_out_and_prune(self):
+        # Лента заполняется при подписке и публикации, чистится при отписке.
+        follow_url = reverse(
+            "posts:profile_follow",
+            kwargs={"username": self.author_following.username}
+        )
+        self.user_follower_client.get(follow_url)
+        new_post = Post.objects.create(
+            author=self.author_following,
+            text="Новый пост после подписки."
+        )
+        self.assertEqual(
+            list(TimelineEntry.objects.filter(
+                user=self.user_follower).values_list("post", flat=True)),
+            [new_post.pk, self.post.pk]
+        )
+        self.user_follower_client.get(
+            reverse(
+                "posts:profile_unfollow",
+                kwargs={"username": self.author_following.username}
+            )
+        )
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.user_follower).exists()
+        )
+
+    @override_settings(TIMELINE_FANOUT_THRESHOLD=0)
+    def test_hybrid_timeline_pulls_large_authors(self):
+        # Посты авторов выше порога не раскладываются, а подмешиваются.
+        Follow.objects.create(
+            user=self.user_follower,
+            author=self.author_following
+        )
+        new_post = Post.objects.create(
+            author=self.author_following,
+            text="Пост автора с большим числом подписчиков."
+        )
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.user_follower).exists()
+        )
+        response = self.user_follower_client.get(
+            reverse("posts:follow_index")
+        )
+        self.assertEqual(
+            response.context["page_obj"].object_list,
+            [new_post, self.post]
+        )
+        self.assertEqual(
+            metrics.snapshot()["gauges"]["timeline.fanout_threshold"], 0
+        )
+
+    def test_released_author_posts_pushed(self):
+        # Посты, написанные выше порога, раскладываются, когда автор
+        # опускается ниже него.
+        Follow.objects.create(
+            user=self.user_follower,
+            author=self.author_following
+        )
+        with override_settings(TIMELINE_FANOUT_THRESHOLD=0):
+            cache.clear()
+            pulled_post = Post.objects.create(
+                author=self.author_following,
+                text="Пост, пока автор выше порога."
+            )
+        self.assertFalse(TimelineEntry.objects.filter(
+            post=pulled_post).exists())
+        cache.clear()
+        self.assertEqual(timeline.pull_authors(), frozenset())
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user_follower, post=pulled_post).exists())
+
+    @override_settings(TIMELINE_FANOUT_THRESHOLD=0, TIMELINE_MAX_PAGE=3)
+    def test_deep_page_number_clamped(self):
+        # ?page=N не читает ленту глубже TIMELINE_MAX_PAGE страниц.
+        Follow.objects.create(
+            user=self.user_follower,
+            author=self.author_following
+        )
+        paginator = timeline.TimelinePaginator(
+            timeline.timeline_posts(self.user_follower), 1,
+            user=self.user_follower)
+        limits = []
+        fetch = paginator.fetch
+        paginator.fetch = lambda key, backwards, limit: (
+            limits.append(limit) or fetch(key, backwards, limit))
+        page = paginator.get_page(10 ** 9)
+        self.assertEqual(limits, [4])
+        self.assertEqual(list(page.object_list), [self.post])
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="etag_author")
+        cls.group = Group.objects.create(
+            title="Группа", slug="etag_slug", description="Описание")
+        cls.post = Post.objects.create(
+            text="Пост с валидаторами", author=cls.user, group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.urls = (
+            reverse("posts:post_detail", args=[self.post.pk]),
+            reverse("posts:group_list", args=[self.group.slug]),
+            reverse("posts:profile", args=[self.user.username]),
+        )
+
+    def test_not_modified(self):
+        """Повторный запрос с валидатором получает 304 без рендеринга."""
+        for url in self.urls:
+            response = self.client.get(url)
+            validators = {
+                "HTTP_IF_NONE_MATCH": response["ETag"],
+                "HTTP_IF_MODIFIED_SINCE": response["Last-Modified"],
+            }
+            for header, value in validators.items():
+                with self.subTest(url=url, header=header):
+                    with self.assertTemplateNotUsed("base.html"):
+                        response = self.client.get(url, **{header: value})
+                    self.assertEqual(
+                        response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_changes_invalidate_validators(self):
+        """Новый пост или комментарий меняют ETag и Last-Modified."""
+        responses = {url: self.client.get(url) for url in self.urls}
+        author = User.objects.create_user(username="commentator")
+        self.post.comments.create(author=author, text="Комментарий")
+        Post.objects.create(
+            text="Новый пост", author=self.user, group=self.group)
+        for url, response in responses.items():
+            with self.subTest(url=url):
+                fresh = self.client.get(
+                    url,
+                    HTTP_IF_NONE_MATCH=response["ETag"],
+                )
+                self.assertEqual(fresh.status_code, HTTPStatus.OK)
+
+    def test_group_edit_invalidates_validators(self):
+        """Правка описания группы меняет и ETag, и Last-Modified."""
+        url = self.urls[1]
+        response = self.client.get(url)
+        group = Group.objects.get(pk=self.group.pk)
+        group.description = "Новое описание"
+        # Last-Modified точен до секунды: правка - секундой позже.
+        with mock.patch(
+                "posts.feed_cache.time.time", return_value=time.time() + 1):
+            group.save()
+        for header, value in (
+            ("HTTP_IF_NONE_MATCH", response["ETag"]),
+            ("HTTP_IF_MODIFIED_SINCE", response["Last-Modified"]),
+        ):
+            with self.subTest(header=header):
+                fresh = self.client.get(url, **{header: value})
+                self.assertEqual(fresh.status_code, HTTPStatus.OK)
+                self.assertContains(fresh, "Новое описание")
+
+    def test_etag_depends_on_user(self):
+        """Вошедший пользователь не получает 304 на анонимную версию."""
+        url = self.urls[2]
+        response = self.client.get(url)
+        self.client.force_login(self.user)
+        self.assertEqual(
+            self.client.get(
+                url,
+                HTTP_IF_NONE_MATCH=response["ETag"],
+                HTTP_IF_MODIFIED_SINCE=response["Last-Modified"],
+            ).status_code,
+            HTTPStatus.OK,
+        )
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username="searcher", first_name="Лев", last_name="Толстой")
+        cls.group = Group.objects.create(
+            title="Русская проза", slug="prose", description="Проза")
+        cls.novel = Post.objects.create(
+            author=cls.author, group=cls.group,
+            text="Все счастливые семьи похожи друг на друга")
+        cls.mention = Post.objects.create(
+            author=cls.author, text="Семьи, семьи и еще раз семьи")
+        for i in range(SORT_VALUE + 2):
+            Post.objects.create(author=cls.author, text=f"Черновик {i}")
+
+    def search(self, query, **params):
+        return self.client.get(
+            reverse("posts:search"), {"q": query, **params})
+
+    def found(self, response):
+        return [post.pk for post in response.context["page_obj"]]
+
+    def test_ranked_by_relevance(self):
+        """Пост с частым словом выше, запрос ищет по префиксу."""
+        response = self.search("семь")
+        self.assertEqual(
+            self.found(response), [self.mention.pk, self.novel.pk])
+
+    def test_author_and_group(self):
+        self.assertEqual(self.found(self.search("проза")), [self.novel.pk])
+        self.assertEqual(
+            len(self.found(self.search("Толстой"))), SORT_VALUE)
+        self.group.title = "Классика"
+        self.group.save()
+        self.assertEqual(
+            self.found(self.search("классика")), [self.novel.pk])
+
+    def test_index_follows_changes(self):
+        novel = Post.objects.get(pk=self.novel.pk)
+        novel.text = "Анна Каренина"
+        novel.save()
+        self.assertEqual(self.found(self.search("каренина")), [novel.pk])
+        novel.delete()
+        self.assertEqual(self.found(self.search("каренина")), [])
+
+    def test_cursor_pages(self):
+        first = self.search("черновик")
+        second = self.search(
+            "черновик", cursor=first.context["page_obj"].next_cursor)
+        self.assertEqual(len(self.found(first)), SORT_VALUE)
+        self.assertEqual(len(self.found(second)), 2)
+        self.assertFalse(set(self.found(first)) & set(self.found(second)))
+        previous = self.search(
+            "черновик", cursor=second.context["page_obj"].previous_cursor)
+        self.assertEqual(self.found(previous), self.found(first))
+
+    def test_query_syntax_is_escaped(self):
+        response = self.search('"семьи" OR NOT (*')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(self.found(response), [])
+
+    def test_admin_search_uses_index(self):
+        admin = User.objects.create_superuser(
+            "admin", "admin@example.com", "password")
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse("admin:posts_post_changelist"), {"q": "Толстой"})
+        self.assertEqual(response.context["cl"].result_count, SORT_VALUE + 4)
+
+
+class AutocompleteTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.leo = User.objects.create_user(
+            username="leo", first_name="Лев", last_name="Толстой")
+        User.objects.create_user(username="Lermontov")
+        cls.group = Group.objects.create(
+            title="Лето", slug="summer", description="Лето")
+
+    def setUp(self):
+        cache.clear()
+
+    def complete(self, prefix):
+        response = self.client.get(
+            reverse("posts:autocomplete"), {"q": prefix})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return [item["label"] for item in response.json()["results"]]
+
+    def test_prefix_without_queries(self):
+        """После построения индекса подсказки не обращаются к базе."""
+        self.assertEqual(self.complete("le"), ["leo", "Lermontov"])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.complete("ЛЕ"), ["Лето"])
+            self.assertEqual(self.complete("sum"), ["Лето"])
+            self.assertEqual(self.complete("x"), [])
+
+    def test_follows_changes(self):
+        self.assertEqual(self.complete("leo"), ["leo"])
+        leo = User.objects.get(pk=self.leo.pk)
+        leo.username = "tolstoy"
+        leo.save()
+        Group.objects.create(title="Леса", slug="forest")
+        Group.objects.get(pk=self.group.pk).delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.complete("leo"), [])
+            self.assertEqual(self.complete("tol"), ["tolstoy"])
+            self.assertEqual(self.complete("ле"), ["Леса"])
+        url = reverse("posts:autocomplete")
+        item = self.client.get(url, {"q": "tol"}).json()["results"][0]
+        self.assertEqual(
+            item["url"], reverse("posts:profile", args=["tolstoy"]))
+        self.assertEqual(item["name"], "Лев Толстой")
+
+    def test_sequence_evicted(self):
+        """Вытесненный счетчик не обнуляется в старом поколении."""
+        self.assertEqual(self.complete("leo"), ["leo"])
+        for number in range(3):
+            User.objects.create_user(username=f"leonid{number}")
+        self.assertEqual(len(self.complete("leo")), 4)
+        cache.delete(autocomplete.SEQUENCE_KEY)
+        # Столько же изменений, сколько процесс уже применил: по одному
+        # номеру новых изменений не отличить от старых.
+        for number in range(3):
+            User.objects.create_user(username=f"leonardo{number}")
+        self.assertEqual(len(self.complete("leo")), 7)
+
+
+@override_settings(CACHES={"default": {
+    "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+    "LOCATION": "autocomplete_test_cache",
+}})
+class AutocompleteDatabaseCacheTest(TestCase):
+    """Автодополнение с кэшем в базе, как при YATUBE_CACHE=db."""
+    @classmethod
+    def setUpTestData(cls):
+        call_command("createcachetable", verbosity=0)
+        User.objects.create_user(username="leo")
+
+    def test_one_cache_query_per_prefix(self):
+        autocomplete.complete("le")
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                [item["label"] for item in autocomplete.complete("le")],
+                ["leo"])
+
+    def test_sequence_evicted(self):
+        autocomplete.complete("le")
+        User.objects.create_user(username="lev")
+        self.assertEqual(len(autocomplete.complete("le")), 2)
+        cache.delete(autocomplete.SEQUENCE_KEY)
+        User.objects.create_user(username="levin")
+        self.assertEqual(
+            {item["label"] for item in autocomplete.complete("le")},
+            {"leo", "lev", "levin"})
+
+
+class CommentsPaginationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="commentator")
+        cls.post = Post.objects.create(author=cls.user, text="Пост")
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.user, text=f"Комментарий {i}")
+            for i in range(COMMENTS_PER_PAGE + 5)
+        )
+        cls.url = reverse("posts:post_comments", args=[cls.post.pk])
+
+    def test_first_page_on_post_detail(self):
+        response = self.client.get(
+            reverse("posts:post_detail", args=[self.post.pk]))
+        comments = response.context["comments"]
+        self.assertEqual(len(comments), COMMENTS_PER_PAGE)
+        self.assertEqual(response.context["next_after"], comments[-1].pk)
+        self.assertContains(response, f"{self.url}?after={comments[-1].pk}")
+
+    def test_load_more(self):
+        """Продолжение отдается фрагментом за постоянное число запросов."""
+        first = Comment.objects.order_by("created", "pk")[
+            COMMENTS_PER_PAGE - 1]
+        with self.assertNumQueries(2):
+            page = self.client.get(self.url, {"after": first.pk}).json()
+        self.assertIsNone(page["next"])
+        self.assertEqual(page["html"].count('class="media mb-4"'), 5)
+        self.assertIn(f"Комментарий {COMMENTS_PER_PAGE + 4}", page["html"])
+        self.assertNotIn(f"Комментарий {COMMENTS_PER_PAGE - 1}<", page["html"])
+        page = self.client.get(self.url).json()
+        self.assertEqual(page["next"], f"{self.url}?after={first.pk}")
+
+    def test_unknown_cursor(self):
+        for after in ("abc", "999999"):
+            with self.subTest(after=after):
+                response = self.client.get(self.url, {"after": after})
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ExportTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="exporter")
+        cls.other = User.objects.create_user(username="other")
+        cls.gif = (
+            b"\x47\x49\x46\x38\x39\x61\x01\x00\x01\x00\x00\x00\x00"
+            b"\x21\xf9\x04\x01\x0a\x00\x01\x00\x2c\x00\x00\x00\x00"
+            b"\x01\x00\x01\x00\x00\x02\x02\x4c\x01\x00\x3b"
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text="Пост с картинкой",
+            image=SimpleUploadedFile("small.gif", cls.gif, "image/gif"),
+        )
+        Post.objects.create(author=cls.other, text="Чужой пост")
+        Comment.objects.create(
+            post=cls.post, author=cls.user, text="Свой комментарий")
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_anonymous_redirected(self):
+        response = self.client.get(reverse("posts:export"))
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+
+    def test_archive_streamed(self):
+        """Архив отдается потоком и содержит только данные автора."""
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("posts:export"))
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/zip")
+        archive = zipfile.ZipFile(
+            BytesIO(b"".join(response.streaming_content)))
+        posts = [
+            json.loads(line)
+            for line in archive.read("posts.jsonl").decode().splitlines()
+        ]
+        self.assertEqual([post["id"] for post in posts], [self.post.pk])
+        self.assertEqual(posts[0]["image"], self.post.image.name)
+        comments = archive.read("comments.jsonl").decode().splitlines()
+        self.assertEqual(json.loads(comments[0])["text"], "Свой комментарий")
+        self.assertEqual(archive.read(self.post.image.name), self.gif)
+        self.assertIsNone(archive.testzip())
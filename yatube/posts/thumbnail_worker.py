@@ -0,0 +1,18 @@
+"""Точки входа процессов пула превью.
+
+Модуль не импортирует модели: процесс, запущенный через spawn,
+распаковывает задачу раньше, чем настроен Django.
+"""
+import django
+from django.apps import apps
+
+
+def init():
+    if not apps.ready:
+        django.setup()
+
+
+def build(name):
+    from .thumbnails import generate
+
+    return generate(name)
@@ -0,0 +1,288 @@
+"""Превью картинок постов, построенные заранее.
+
+Все превью из THUMBNAIL_PRESETS строятся после сохранения поста в пуле
+процессов, а шаблоны только ищут готовое превью в хранилище sorl и,
+пока его нет, показывают исходную картинку.
+"""
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+from PIL import Image
+from sorl.thumbnail import default
+from sorl.thumbnail.base import EXTENSIONS, ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import (
+    EMPTY_VALUE, KVStore as CachedDBKVStore,
+)
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from core import metrics
+from . import cards, feed_cache, thumbnail_worker
+from .models import Post
+
+logger = logging.getLogger(__name__)
+_executor = None
+
+
+# MIME-типы современных форматов для <source type="...">.
+FORMAT_TYPES = {"AVIF": "image/avif", "WEBP": "image/webp"}
+
+
+class PresetBackend(ThumbnailBackend):
+    """Находит готовое превью по тем же правилам, что get_thumbnail."""
+
+    def thumbnail_file(self, file_, geometry_string, **options):
+        # Повторяет подготовку опций из ThumbnailBackend.get_thumbnail,
+        # иначе имя превью не совпадет; совпадение проверяет тест.
+        source = ImageFile(file_)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault("format", self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        # Имя строит сам sorl, но расширения знает не для всех форматов,
+        # которые пишет Pillow (например, AVIF).
+        EXTENSIONS.setdefault(options["format"], options["format"].lower())
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def lookup(self, file_, geometry_string, **options):
+        """Готовое превью или None; само превью не строится."""
+        thumbnail = self.thumbnail_file(file_, geometry_string, **options)
+        return default.kvstore.get(thumbnail)
+
+
+backend = PresetBackend()
+
+
+@lru_cache(maxsize=None)
+def supported_formats():
+    """Форматы из THUMBNAIL_SRCSET_FORMATS, которые умеет писать Pillow."""
+    Image.init()
+    return tuple(
+        format_ for format_ in settings.THUMBNAIL_SRCSET_FORMATS
+        if format_ in Image.SAVE
+    )
+
+
+def _widths(geometry):
+    # Уменьшенные копии геометрии с тем же соотношением сторон. Превью,
+    # заданные только высотой ("x369"), строятся в одном размере.
+    width, _, height = geometry.partition("x")
+    if not width:
+        return [geometry]
+    width = int(width)
+    geometries = []
+    for smaller in settings.THUMBNAIL_SRCSET_WIDTHS:
+        if smaller < width:
+            geometries.append(
+                f"{smaller}x{round(int(height) * smaller / width)}"
+                if height else str(smaller)
+            )
+    return geometries + [geometry]
+
+
+def variants(preset):
+    """Варианты превью пресета: (формат, геометрия, опции).
+
+    Формат None - формат sorl по умолчанию, им заполняется <img>.
+    """
+    geometry, options = settings.THUMBNAIL_PRESETS[preset]
+    result = []
+    for format_ in (None, *supported_formats()):
+        for size in _widths(geometry):
+            variant_options = dict(options)
+            if format_:
+                variant_options["format"] = format_
+            result.append((format_, size, variant_options))
+    return result
+
+
+def preset_thumbnail(image, preset):
+    """Готовое превью картинки для пресета из THUMBNAIL_PRESETS."""
+    if not image:
+        return None
+    geometry, options = settings.THUMBNAIL_PRESETS[preset]
+    return backend.lookup(image, geometry, **options)
+
+
+def lookup_many(thumbnails):
+    """Готовые превью из списка ImageFile: ключ -> ImageFile.
+
+    Для кэшируемого хранилища sorl все ключи читаются одним get_many,
+    а промахи кэша - одним запросом с IN, вместо запроса на каждое превью.
+    """
+    kvstore = default.kvstore
+    if not isinstance(kvstore, CachedDBKVStore):
+        found = {}
+        for thumbnail in thumbnails:
+            cached = kvstore.get(thumbnail)
+            if cached is not None:
+                found[thumbnail.key] = cached
+        return found
+    keys = {
+        add_prefix(thumbnail.key): thumbnail.key for thumbnail in thumbnails
+    }
+    values = kvstore.cache.get_many(list(keys))
+    missing = [key for key in keys if key not in values]
+    if missing:
+        stored = dict(KVStoreModel.objects.filter(
+            key__in=missing).values_list("key", "value"))
+        # Как и sorl, запоминаем в кэше и отсутствие превью.
+        loaded = {key: stored.get(key, EMPTY_VALUE) for key in missing}
+        kvstore.cache.set_many(
+            loaded, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        values.update(loaded)
+    return {
+        keys[key]: deserialize_image_file(value)
+        for key, value in values.items() if value != EMPTY_VALUE
+    }
+
+
+def _format_type(format_):
+    return FORMAT_TYPES.get(format_) or Image.MIME.get(format_)
+
+
+def _srcset(thumbnails):
+    return ", ".join(f"{im.url} {im.width}w" for im in thumbnails)
+
+
+def pictures(images, preset):
+    """Данные для <picture> пресета по именам картинок.
+
+    Все превью всех картинок страницы ищутся одним пакетом. Картинок,
+    у которых превью еще не построены, в ответе нет.
+    """
+    geometry, _ = settings.THUMBNAIL_PRESETS[preset]
+    plan = []
+    for image in images:
+        if not image:
+            continue
+        for format_, size, options in variants(preset):
+            thumbnail = backend.thumbnail_file(image, size, **options)
+            base = format_ is None and size == geometry
+            plan.append((image.name, format_, base, thumbnail))
+    found = lookup_many([thumbnail for *_, thumbnail in plan])
+    result = {}
+    for name, format_, base, thumbnail in plan:
+        thumbnail = found.get(thumbnail.key)
+        if thumbnail is None:
+            continue
+        entry = result.setdefault(name, {"base": None, "formats": {}})
+        entry["formats"].setdefault(format_, []).append(thumbnail)
+        if base:
+            entry["base"] = thumbnail
+    return {
+        name: {
+            "src": entry["base"].url,
+            "srcset": _srcset(entry["formats"].pop(None)),
+            "sources": [
+                {"type": _format_type(format_), "srcset": _srcset(items)}
+                for format_, items in entry["formats"].items()
+                # Без MIME-типа браузер не выберет <source>, пропускаем.
+                if _format_type(format_)
+            ],
+        }
+        for name, entry in result.items() if entry["base"] is not None
+    }
+
+
+def picture(image, preset):
+    """Данные для <picture> пресета или None, пока превью не построены."""
+    if not image:
+        return None
+    return pictures([image], preset).get(image.name)
+
+
+def source_file(name):
+    """Исходник превью: картинка поста в хранилище поля Post.image.
+
+    Превью ищутся по ключу исходника, в который входит его хранилище,
+    поэтому имя без хранилища не найдет построенные превью.
+    """
+    return ImageFile(name, Post._meta.get_field("image").storage)
+
+
+def _all_variants():
+    for preset in settings.THUMBNAIL_PRESETS:
+        yield from variants(preset)
+
+
+def generate(name):
+    """Строит недостающие превью картинки в процессе пула.
+
+    Возвращает name, если что-то было построено, иначе None.
+    """
+    source = source_file(name)
+    planned = [
+        (geometry, options,
+         backend.thumbnail_file(source, geometry, **options))
+        for _, geometry, options in _all_variants()
+    ]
+    found = lookup_many([thumbnail for *_, thumbnail in planned])
+    built = False
+    for geometry, options, thumbnail in planned:
+        if thumbnail.key not in found:
+            backend.get_thumbnail(source, geometry, **options)
+            built = True
+    return name if built else None
+
+
+def ready(name):
+    """Превью построены: перерисовываем карточки постов с картинкой."""
+    # Промах поиска sorl кэширует, сбрасываем его для новых превью.
+    source = source_file(name)
+    for _, geometry, options in _all_variants():
+        thumbnail = backend.thumbnail_file(source, geometry, **options)
+        default.kvstore.cache.delete(add_prefix(thumbnail.key))
+    cards.touch(image=name)
+    for post in Post.objects.filter(image=name).only("author", "group"):
+        feed_cache.bump(*feed_cache.post_scopes(post))
+
+
+def _done(future):
+    # Выполняется в служебном потоке родителя, а не в запросе.
+    try:
+        name = future.result()
+        if name:
+            ready(name)
+            metrics.incr("thumbnails.generated")
+    except Exception:
+        metrics.incr("thumbnails.failed")
+        logger.exception("Не удалось построить превью")
+    finally:
+        connection.close()
+
+
+def executor(workers=None):
+    """Пул процессов для превью; процессы запускаются с чистым Django."""
+    return ProcessPoolExecutor(
+        max_workers=workers or settings.THUMBNAIL_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=thumbnail_worker.init,
+    )
+
+
+def schedule(name):
+    """Ставит построение превью в очередь пула.
+
+    При THUMBNAIL_WORKERS = 0 превью строятся сразу в этом процессе.
+    """
+    global _executor
+    if not settings.THUMBNAIL_WORKERS:
+        if generate(name):
+            ready(name)
+        return
+    if _executor is None:
+        _executor = executor()
+    _executor.submit(thumbnail_worker.build, name).add_done_callback(_done)
@@ -0,0 +1,266 @@
+import heapq
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Page
+from django.db.models import F
+from django.utils import timezone
+
+from core import metrics
+from .models import Follow, Post, TimelineEntry, UserStats
+from .paginator import CursorPaginator
+
+BATCH_SIZE = 500  # Размер пачки при массовой вставке записей ленты.
+# Порядок ленты подписок: по ключу записи ленты, а не поста.
+TIMELINE_ORDERING = ("-feed_date", "-feed_post")
+PULL_AUTHORS_KEY = "timeline:pull_authors"
+# Пост, сохранявшийся в момент отметки автора, мог получить дату чуть
+# раньше pulled_since, а раскладку уже пропустить.
+CATCH_UP_MARGIN = timedelta(minutes=1)
+RECENT_KEY = "timeline:recent:{}"
+
+
+def _catch_up(author_id, since):
+    """Раскладывает посты, написанные, пока автор был выше порога."""
+    posts = list(Post.objects.filter(
+        author_id=author_id, pub_date__gte=since - CATCH_UP_MARGIN
+    ).order_by().values_list("pk", "pub_date"))
+    if not posts:
+        return
+    followers = Follow.objects.filter(author_id=author_id).values_list(
+        "user_id", flat=True).iterator()
+    _insert(
+        TimelineEntry(
+            user_id=user_id,
+            post_id=post_id,
+            author_id=author_id,
+            pub_date=pub_date,
+        )
+        for user_id in followers
+        for post_id, pub_date in posts
+    )
+    metrics.incr("timeline.caught_up")
+
+
+def _sync_pulled(threshold):
+    """Отмечает в UserStats авторов, перешедших порог в любую сторону.
+
+    Автору, опустившемуся ниже порога, раскладываются посты с момента
+    pulled_since, иначе они пропали бы из лент подписчиков. Отметка
+    снимается до раскладки: новый пост за это время либо разложит
+    fan_out, либо найдет раскладка. Снимает отметку ровно один процесс.
+    """
+    UserStats.objects.filter(
+        pulled_since__isnull=True, followers_count__gt=threshold
+    ).update(pulled_since=timezone.now())
+    released = UserStats.objects.filter(
+        pulled_since__isnull=False, followers_count__lte=threshold
+    ).values_list("user_id", "pulled_since")
+    for author_id, since in list(released):
+        if UserStats.objects.filter(
+                user_id=author_id, pulled_since=since).update(
+                pulled_since=None):
+            _catch_up(author_id, since)
+
+
+def _is_pulled(author_id):
+    # Для записи проверяем отметку в базе, а не кэш: кэш другого
+    # процесса может еще считать автора крупным после раскладки.
+    pull_authors()
+    return UserStats.objects.filter(
+        user_id=author_id, pulled_since__isnull=False).exists()
+
+
+def pull_authors():
+    """Авторы, у которых подписчиков больше порога.
+
+    Их посты не раскладываются по лентам, а подмешиваются при чтении.
+    Набор обновляется раз в TIMELINE_PULL_AUTHORS_TTL секунд.
+    """
+    authors = cache.get(PULL_AUTHORS_KEY)
+    if authors is None:
+        threshold = settings.TIMELINE_FANOUT_THRESHOLD
+        _sync_pulled(threshold)
+        authors = frozenset(
+            UserStats.objects.filter(
+                pulled_since__isnull=False).values_list(
+                "user_id", flat=True)
+        )
+        cache.set(
+            PULL_AUTHORS_KEY, authors, settings.TIMELINE_PULL_AUTHORS_TTL)
+        metrics.gauge("timeline.fanout_threshold", threshold)
+        metrics.gauge("timeline.pull_authors", len(authors))
+    return authors
+
+
+def recent_posts(author_id):
+    """Ключи последних постов автора, от новых к старым, из кэша."""
+    key = RECENT_KEY.format(author_id)
+    recent = cache.get(key)
+    if recent is None:
+        recent = list(
+            Post.objects.filter(author_id=author_id).order_by(
+                "-pub_date", "-pk").values_list(
+                "pub_date", "pk")[:settings.TIMELINE_RECENT_POSTS]
+        )
+        cache.set(key, recent)
+    return recent
+
+
+def _insert(entries):
+    batch = []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) >= BATCH_SIZE:
+            TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    cache.delete(RECENT_KEY.format(post.author_id))
+    if _is_pulled(post.author_id):
+        metrics.incr("timeline.fanout_skipped")
+        return
+    followers = Follow.objects.filter(author_id=post.author_id).values_list(
+        "user_id", flat=True).iterator()
+    _insert(
+        TimelineEntry(
+            user_id=user_id,
+            post_id=post.pk,
+            author_id=post.author_id,
+            pub_date=post.pub_date,
+        )
+        for user_id in followers
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту подписчика все посты нового автора."""
+    if _is_pulled(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).order_by().values_list(
+        "pk", "pub_date").iterator()
+    _insert(
+        TimelineEntry(
+            user_id=user_id,
+            post_id=post_id,
+            author_id=author_id,
+            pub_date=pub_date,
+        )
+        for post_id, pub_date in posts
+    )
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты посты автора после отписки."""
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def timeline_posts(user):
+    """Посты ленты подписок с ключом сортировки из записей ленты."""
+    return Post.objects.filter(timeline_entries__user=user).annotate(
+        feed_date=F("timeline_entries__pub_date"),
+        feed_post=F("timeline_entries__post"),
+        feed_author=F("timeline_entries__author"),
+    )
+
+
+class TimelinePaginator(CursorPaginator):
+    """Гибридная лента: разложенные записи плюс посты крупных авторов.
+
+    Посты авторов выше TIMELINE_FANOUT_THRESHOLD берутся из кэша
+    последних постов каждого автора и сливаются с лентой через heapq.
+    """
+
+    def __init__(self, object_list, per_page, user, **kwargs):
+        super().__init__(object_list, per_page, TIMELINE_ORDERING, **kwargs)
+        pulled = pull_authors()
+        self.pulled = []
+        if pulled:
+            self.pulled = list(Follow.objects.filter(
+                user=user, author_id__in=pulled).values_list(
+                "author_id", flat=True))
+            self.object_list = self.object_list.exclude(
+                feed_author__in=self.pulled)
+
+    def _after(self, key, backwards):
+        if key is None:
+            return lambda item: True
+        if backwards:
+            return lambda item: item > key
+        return lambda item: item < key
+
+    def _pulled_keys(self, author_id, key, backwards, limit):
+        recent = recent_posts(author_id)
+        after = self._after(key, backwards)
+        keys = [item for item in recent if after(item)]
+        if backwards:
+            keys.reverse()
+        complete = len(recent) < settings.TIMELINE_RECENT_POSTS or (
+            len(keys) >= limit if not backwards
+            else key is not None and key >= recent[-1]
+        )
+        if complete:
+            return keys[:limit]
+        metrics.incr("timeline.pull_cache_miss")
+        ordering = ("pub_date", "pk") if backwards else ("-pub_date", "-pk")
+        queryset = Post.objects.filter(author_id=author_id).order_by(
+            *ordering)
+        if key is not None:
+            queryset = queryset.filter(
+                CursorPaginator(queryset, limit, ordering).keyset_filter(key))
+        return list(queryset.values_list("pub_date", "pk")[:limit])
+
+    def fetch(self, key, backwards, limit):
+        pushed = super().fetch(key, backwards, limit)
+        if not self.pulled:
+            return pushed
+        with metrics.timer("timeline.merge"):
+            sources = [[(self.get_key(post), post) for post in pushed]]
+            for author_id in self.pulled:
+                sources.append([
+                    (item, None)
+                    for item in self._pulled_keys(
+                        author_id, key, backwards, limit)
+                ])
+            merged = list(islice(heapq.merge(
+                *sources, key=lambda pair: pair[0], reverse=not backwards
+            ), limit))
+            metrics.incr("timeline.merge_sources", len(sources))
+            metrics.incr(
+                "timeline.merge_items", sum(len(src) for src in sources))
+        missing = Post.objects.in_bulk(
+            [pk for (_, pk), post in merged if post is None])
+        result = []
+        for (pub_date, pk), post in merged:
+            if post is None:
+                post = missing.get(pk)
+                if post is None:
+                    continue
+                post.feed_date, post.feed_post = pub_date, pk
+                post.feed_author = post.author_id
+            result.append(post)
+        return result
+
+    def get_page(self, number):
+        """?page=N для слитой ленты: берём N страниц подряд по курсору."""
+        try:
+            number = max(int(number), 1)
+        except (TypeError, ValueError):
+            number = 1
+        # Каждая страница - это все предыдущие, поэтому глубину
+        # ограничиваем; дальше листают курсором.
+        number = min(number, settings.TIMELINE_MAX_PAGE)
+        items = self.fetch(None, False, number * self.per_page + 1)
+        has_next = len(items) > number * self.per_page
+        number = min(number, max((len(items) - 1) // self.per_page + 1, 1))
+        start = (number - 1) * self.per_page
+        page = Page(items[start:start + self.per_page], number, self)
+        page.cursor = f"page-{number}"
+        self._set_cursors(page, number > 1, has_next)
+        return page
@@ -0,0 +1,113 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Comment, Post, PostScore
+
+# Окна рейтинга: длина окна и период полураспада веса комментария.
+WINDOWS = {
+    "day": (timedelta(days=1), timedelta(hours=6)),
+    "week": (timedelta(days=7), timedelta(days=2)),
+}
+# Рейтинг ниже порога считаем нулевым и удаляем строку.
+MIN_SCORE = 1e-3
+BATCH_SIZE = 500
+TRENDING_ORDERING = ("-trend_score", "-trend_post")
+
+
+def _weight(created, now, half_life):
+    return 0.5 ** ((now - created) / half_life)
+
+
+def _contributions(since, until, now, half_life):
+    """Текущий вес комментариев, созданных в (since, until], по постам."""
+    deltas = defaultdict(float)
+    comments = Comment.objects.filter(
+        created__gt=since, created__lte=until).values_list(
+        "post_id", "created").iterator()
+    for post_id, created in comments:
+        deltas[post_id] += _weight(created, now, half_life)
+    return deltas
+
+
+@transaction.atomic
+def update_window(window, now=None, full=False):
+    """Пересчитывает рейтинг окна и возвращает число изменённых постов.
+
+    Обычно читаются только комментарии, пришедшие после прошлого
+    расчёта и выпавшие из окна с тех пор; старые рейтинги просто
+    умножаются на коэффициент затухания. Это одно UPDATE всех строк
+    окна, их число ограничено постами с комментариями за окно. Вес
+    удалённых комментариев вычитает comment_removed, поэтому здесь
+    удалённые не учитываются. Полный пересчёт выполняется при
+    full=True, на пустой таблице или если прошлый расчёт старше окна.
+    """
+    now = now or timezone.now()
+    length, half_life = WINDOWS[window]
+    scores = PostScore.objects.filter(window=window)
+    last = scores.order_by("-updated").values_list(
+        "updated", flat=True).first()
+    if full or last is None or now - last >= length:
+        scores.delete()
+        deltas = _contributions(now - length, now, now, half_life)
+    else:
+        scores.update(
+            score=F("score") * _weight(last, now, half_life), updated=now)
+        deltas = _contributions(last, now, now, half_life)
+        expired = _contributions(last - length, now - length, now, half_life)
+        for post_id, weight in expired.items():
+            deltas[post_id] -= weight
+    post_ids = list(deltas)
+    existing = {}
+    for start in range(0, len(post_ids), BATCH_SIZE):
+        for row in scores.filter(
+                post_id__in=post_ids[start:start + BATCH_SIZE]):
+            existing[row.post_id] = row
+    changed, created = [], []
+    for post_id, delta in deltas.items():
+        row = existing.get(post_id)
+        if row is None:
+            created.append(PostScore(
+                post_id=post_id, window=window, score=delta, updated=now))
+        else:
+            row.score, row.updated = row.score + delta, now
+            changed.append(row)
+    PostScore.objects.bulk_update(changed, ["score", "updated"], BATCH_SIZE)
+    PostScore.objects.bulk_create(created, BATCH_SIZE)
+    scores.filter(score__lt=MIN_SCORE).delete()
+    return len(deltas)
+
+
+def comment_removed(post_id, created):
+    """Вычитает вес удалённого комментария из рейтингов его окон."""
+    rows = PostScore.objects.filter(post_id=post_id).values_list(
+        "window", "updated")
+    for window, updated in rows:
+        length, half_life = WINDOWS[window]
+        # Комментарий учтён, если попал в окно на момент расчёта строки.
+        if not updated - length < created <= updated:
+            continue
+        # Условие на updated: строку не успел переписать новый расчёт.
+        scores = PostScore.objects.filter(
+            window=window, post_id=post_id, updated=updated)
+        scores.update(
+            score=F("score") - _weight(created, updated, half_life))
+        scores.filter(score__lt=MIN_SCORE).delete()
+
+
+def best_post(window="day"):
+    """Самый обсуждаемый пост окна по готовой таблице рейтинга."""
+    row = PostScore.objects.filter(window=window).order_by(
+        "-score", "-post_id").select_related("post__author").first()
+    return row.post if row else None
+
+
+def trending_posts(window):
+    """Посты окна с ключом сортировки по рейтингу."""
+    return Post.objects.filter(scores__window=window).annotate(
+        trend_score=F("scores__score"),
+        trend_post=F("scores__post"),
+    )
@@ -0,0 +1,91 @@
+"""Проверка и очистка загружаемых картинок постов.
+
+Размеры проверяются по заголовку файла, до декодирования пикселей,
+поэтому огромная или «бомбовая» картинка отклоняется без затрат памяти.
+Уменьшение идет через draft: JPEG сразу декодируется в уменьшенном
+масштабе, а не в исходном разрешении.
+"""
+import os
+import warnings
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, ImageOps
+
+# Сохраняем в том же формате; форматы, которые Pillow только читает
+# (например, MPO с телефонов), пересохраняем в JPEG.
+FALLBACK_FORMAT = "JPEG"
+SAVE_OPTIONS = {
+    "JPEG": {"quality": 90, "optimize": True},
+    "WEBP": {"quality": 90},
+    "PNG": {"optimize": True},
+}
+
+
+def _open(upload):
+    upload.seek(0)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", Image.DecompressionBombWarning)
+        try:
+            return Image.open(upload)
+        except (Image.DecompressionBombWarning,
+                Image.DecompressionBombError):
+            raise ValidationError(
+                "Слишком большое разрешение картинки.", code="too_large")
+        except OSError:
+            raise ValidationError(
+                "Загрузите правильное изображение.", code="invalid_image")
+
+
+def sanitize_image(upload):
+    """Проверяет загруженную картинку и возвращает файл для сохранения.
+
+    Картинка без EXIF и в допустимых размерах возвращается как есть,
+    иначе она уменьшается до POST_IMAGE_MAX_SIDE и пересохраняется
+    без метаданных.
+    """
+    if upload.size > settings.POST_IMAGE_MAX_BYTES:
+        raise ValidationError(
+            "Файл больше %(limit)s.",
+            code="too_large",
+            params={"limit": filesizeformat(settings.POST_IMAGE_MAX_BYTES)},
+        )
+    image = _open(upload)
+    width, height = image.size
+    if width * height > settings.POST_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            "Слишком большое разрешение картинки: %(width)s×%(height)s.",
+            code="too_large",
+            params={"width": width, "height": height},
+        )
+    max_side = settings.POST_IMAGE_MAX_SIDE
+    oversized = max(width, height) > max_side
+    if not oversized and "exif" not in image.info:
+        upload.seek(0)
+        return upload
+    source_format = image.format
+    format_ = source_format
+    if source_format not in Image.SAVE:
+        format_ = FALLBACK_FORMAT
+    data = BytesIO()
+    # Заголовок мог пройти проверку ImageField, а пиксели - оборваться:
+    # ошибка декодирования видна только здесь.
+    try:
+        image.thumbnail((max_side, max_side))
+        # Поворот из EXIF применяем к пикселям, метаданные выбрасываем.
+        image = ImageOps.exif_transpose(image)
+        image.info.pop("exif", None)
+        if format_ == "JPEG" and image.mode not in ("RGB", "L", "CMYK"):
+            image = image.convert("RGB")
+        image.save(data, format_, **SAVE_OPTIONS.get(format_, {}))
+    except (OSError, Image.DecompressionBombError):
+        raise ValidationError(
+            "Загрузите правильное изображение.", code="invalid_image")
+    name = upload.name
+    if format_ != source_format:
+        name = f"{os.path.splitext(name)[0]}.{format_.lower()}"
+    return SimpleUploadedFile(
+        name, data.getvalue(), content_type=Image.MIME.get(format_))
@@ -7,6 +7,13 @@ app_name = "posts"
 urlpatterns = [
     path("group/<slug:slug>/", views.group_posts, name="group_list"),
     path("", views.index, name="index"),
+    path("trending/", views.trending_list, name="trending"),
+    path("search/", views.search_posts, name="search"),
+    path(
+        "autocomplete/",
+        views.autocomplete_names,
+        name="autocomplete"
+    ),
     path("profile/<str:username>/", views.profile, name="profile"),
     path("posts/<int:post_id>/", views.post_detail, name="post_detail"),
     path("create/", views.post_create, name="post_create"),
@@ -16,7 +23,13 @@ urlpatterns = [
         views.add_comment,
         name="add_comment"
     ),
+    path(
+        "posts/<int:post_id>/comments/",
+        views.post_comments,
+        name="post_comments"
+    ),
     path("follow/", views.follow_index, name="follow_index"),
+    path("export/", views.export_data, name="export"),
     path(
         "profile/<str:username>/follow/",
         views.profile_follow,
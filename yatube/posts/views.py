@@ -1,18 +1,34 @@
+from django.db import IntegrityError, transaction
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.template.loader import render_to_string
+from django.urls import reverse
 from django.shortcuts import render, get_object_or_404, redirect
-from django.db.models import Count
-from .models import Post, Group, User, Follow
-from django.core.paginator import Paginator
+from .models import Comment, Post, Group, User, Follow
 from .forms import PostForm, CommentForm
 from django.contrib.auth.decorators import login_required
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from .paginator import CursorPaginator
+from . import (
+    autocomplete, conditional, counters, export, feed_cache, leaderboard,
+    search, thumbnails, timeline, trending,
+)
 
 
 SORT_VALUE = 10  # Количество вывода записей для сортировки.
+COMMENTS_PER_PAGE = 20
+COMMENTS_ORDERING = ("created", "pk")
 
 
-def page_content(queryset, request):
-    paginator = Paginator(queryset, SORT_VALUE)
+def page_content(queryset, request, paginator_class=CursorPaginator,
+                 **kwargs):
+    paginator = paginator_class(queryset, SORT_VALUE, **kwargs)
     page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    # ?page=N оставлен для старых ссылок, дальше листаем курсором.
+    if page_number is not None:
+        page_obj = paginator.get_page(page_number)
+    else:
+        page_obj = paginator.get_cursor_page(request.GET.get("cursor"))
     return {
         "page_obj": page_obj
     }
@@ -22,19 +38,104 @@ def index(request):
     template = ("posts/index.html")
     name = "Это главная страница проекта Yatube"
     posts = Post.objects.all()
-    # Считаем количество комментариев каждого поста и
-    # передаем в контекст для отображения лучшего поста.
-    better_post = Post.objects.annotate(
-        num_comments=Count('comments')).order_by('-num_comments').first()
+    # Рейтинг за день заранее считает команда update_trending.
+    better_post = trending.best_post("day")
     context = {
         "top_name": name,
         "posts": posts,
-        "better_post": better_post
+        "better_post": better_post,
+        "better_picture": better_post and thumbnails.picture(
+            better_post.image, "best"),
+        "feed_version": feed_cache.version("index"),
     }
     context.update(page_content(posts, request))
     return render(request, template, context)
 
 
+def trending_list(request):
+    template = "posts/trending.html"
+    window = request.GET.get("window", "day")
+    if window in trending.WINDOWS:
+        posts = trending.trending_posts(window)
+        ordering = trending.TRENDING_ORDERING
+    else:
+        # За все время - по счетчику комментариев поста.
+        window = "all"
+        posts = leaderboard.leaderboard_posts()
+        ordering = leaderboard.LEADERBOARD_ORDERING
+    context = {
+        "top_name": "Популярные записи",
+        "window": window,
+    }
+    context.update(page_content(posts, request, ordering=ordering))
+    return render(request, template, context)
+
+
+def search_posts(request):
+    template = "posts/search.html"
+    query = request.GET.get("q", "").strip()
+    context = {
+        "top_name": "Поиск",
+        "query": query,
+    }
+    if query:
+        posts = Post.objects.select_related("author", "group")
+        context.update(page_content(
+            posts, request, paginator_class=search.SearchPaginator,
+            query=query))
+    return render(request, template, context)
+
+
+@cache_control(public=True, max_age=60)
+def autocomplete_names(request):
+    prefix = request.GET.get("q", "").strip()
+    results = autocomplete.complete(prefix) if prefix else []
+    return JsonResponse({"results": results})
+
+
+def comments_page(post_id, after=None):
+    """Комментарии поста после комментария after и pk следующего начала.
+
+    Выбираются по индексу (post, created, id) вместе с авторами; второе
+    значение - pk последнего комментария страницы или None, если
+    дальше комментариев нет.
+    """
+    comments = Comment.objects.filter(post_id=post_id).select_related(
+        "author")
+    paginator = CursorPaginator(
+        comments, COMMENTS_PER_PAGE, ordering=COMMENTS_ORDERING)
+    key = None
+    if after is not None:
+        key = comments.filter(pk=after).values_list(
+            *paginator.get_key_fields()).first()
+        if key is None:
+            raise Http404
+    items = paginator.fetch(key, False, COMMENTS_PER_PAGE + 1)
+    if len(items) > COMMENTS_PER_PAGE:
+        return items[:COMMENTS_PER_PAGE], items[COMMENTS_PER_PAGE - 1].pk
+    return items, None
+
+
+def post_comments(request, post_id):
+    """Следующая страница комментариев: HTML-фрагмент и адрес продолжения."""
+    after = request.GET.get("after")
+    if after is not None and not after.isdigit():
+        raise Http404
+    comments, next_after = comments_page(
+        post_id, int(after) if after else None)
+    next_url = None
+    if next_after is not None:
+        next_url = "{}?after={}".format(
+            reverse("posts:post_comments", args=[post_id]), next_after)
+    html = render_to_string(
+        "includes/comment_list.html", {"comments": comments}, request)
+    return JsonResponse({"html": html, "next": next_url})
+
+
+# Браузер каждый раз сверяет валидаторы, ответ 304 не рендерится.
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=conditional.group_etag,
+           last_modified_func=conditional.group_last_modified)
 def group_posts(request, slug):
     template = ("posts/group_list.html")
     group = get_object_or_404(Group, slug=slug)
@@ -42,15 +143,21 @@ def group_posts(request, slug):
     posts = group.posts.all()
     context = {"top_name": name,
                "group": group,
-               "posts": posts
+               "posts": posts,
+               "feed_version": feed_cache.version(f"group:{group.pk}"),
                }
     context.update(page_content(posts, request))
     return render(request, template, context)
 
 
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=conditional.profile_etag,
+           last_modified_func=conditional.profile_last_modified)
 def profile(request, username):
     template = ("posts/profile.html")
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(
+        User.objects.select_related("stats"), username=username
+    )
     posts = author.posts.filter(author=author).all()
     name = f"Профайл пользователя {author}"
     if request.user.is_authenticated:
@@ -62,19 +169,26 @@ def profile(request, username):
     context = {
         "top_name": name,
         "author": author,
+        "stats": counters.get_stats(author),
         "posts": posts,
-        "following": following
+        "following": following,
+        "feed_version": feed_cache.version(f"profile:{author.pk}"),
     }
     context.update(page_content(posts, request))
     return render(request, template, context)
 
 
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=conditional.post_detail_etag,
+           last_modified_func=conditional.post_detail_last_modified)
 def post_detail(request, post_id):
     template = ("posts/post_detail.html")
-    post = get_object_or_404(Post, pk=post_id)
-    posts_count = Post.objects.filter(author=post.author).count()
+    post = get_object_or_404(
+        Post.objects.select_related("author__stats", "group"), pk=post_id
+    )
+    posts_count = counters.get_stats(post.author).posts_count
     top_name = f"Пост {post.text[:30]}"
-    comments = post.comments.all()
+    comments, next_after = comments_page(post.pk)
     form = CommentForm(
         request.GET or None
     )
@@ -82,8 +196,10 @@ def post_detail(request, post_id):
         "top_name": top_name,
         "posts_count": posts_count,
         "post": post,
+        "picture": thumbnails.picture(post.image, "detail"),
         "form": form,
-        "comments": comments
+        "comments": comments,
+        "next_after": next_after,
     }
     return render(request, template, context)
 
@@ -98,7 +214,9 @@ def post_create(request):
     if form.is_valid():
         form = form.save(commit=False)
         form.author = request.user
-        form.save()
+        # Счетчики автора обновляются сигналом в той же транзакции.
+        with transaction.atomic():
+            form.save()
         return redirect("posts:profile", username=form.author)
     context = {
         "form": form
@@ -137,15 +255,20 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        with transaction.atomic():
+            comment.save()
     return redirect(spacename, post_id=post_id)
 
 
 @login_required
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
+    posts = timeline.timeline_posts(request.user)
     context = {}
-    context.update(page_content(posts, request))
+    context.update(
+        page_content(
+            posts, request, timeline.TimelinePaginator, user=request.user
+        )
+    )
     template = "posts/follow.html"
     return render(request, template, context)
 
@@ -153,16 +276,17 @@ def follow_index(request):
 @login_required
 def profile_follow(request, username):
     return_page = "posts:profile"
-    author = User.objects.get(username=username)
-    if_follower = Follow.objects.filter(
-        user=request.user,
-        author=author
-    )
-    if author != request.user and not if_follower.exists():
-        Follow.objects.create(
-            user=request.user,
-            author=author
-        )
+    author = get_object_or_404(User, username=username)
+    # Повторная подписка и подписка на себя отсекаются ограничениями БД,
+    # поэтому одновременные запросы не создадут дубликатов.
+    try:
+        with transaction.atomic():
+            Follow.objects.create(
+                user=request.user,
+                author=author
+            )
+    except IntegrityError:
+        pass
     return redirect(return_page, author.username)
 
 
@@ -170,10 +294,20 @@ def profile_follow(request, username):
 def profile_unfollow(request, username):
     return_page = "posts:profile"
     author = get_object_or_404(User, username=username)
-    if_follower = Follow.objects.filter(
-        user=request.user,
-        author=author
-    )
-    if if_follower.exists():
-        if_follower.delete()
+    with transaction.atomic():
+        Follow.objects.filter(
+            user=request.user,
+            author=author
+        ).delete()
     return redirect(return_page, author.username)
+
+
+@login_required
+@cache_control(private=True, no_store=True)
+def export_data(request):
+    """Архив постов, комментариев и картинок пользователя."""
+    response = StreamingHttpResponse(
+        export.archive(request.user), content_type="application/zip")
+    response["Content-Disposition"] = (
+        f'attachment; filename="yatube-{request.user.username}.zip"')
+    return response
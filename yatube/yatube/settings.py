@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -42,6 +44,7 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
     'posts.apps.PostsConfig',
+    'api.apps.ApiConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -152,12 +155,84 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 THUMBNAIL_DEBUG = True
+# Загружаемые картинки постов: файлы больше POST_IMAGE_MAX_BYTES и
+# разрешения больше POST_IMAGE_MAX_PIXELS отклоняются по заголовку.
+# Стороны больше POST_IMAGE_MAX_SIDE уменьшаются, EXIF удаляется.
+POST_IMAGE_MAX_BYTES = 20 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 40_000_000
+POST_IMAGE_MAX_SIDE = 2560
+# Превью картинок постов: имя -> (геометрия, опции sorl). Все превью
+# строятся сразу после загрузки в пуле из THUMBNAIL_WORKERS процессов
+# (по умолчанию два). Пул свой у каждого воркера gunicorn: N воркеров
+# дают до 2N процессов Pillow, а запись в базу после сборки идет из
+# служебного потока воркера (см. README). YATUBE_THUMBNAIL_WORKERS=0
+# отключает пул: превью строятся в процессе, принявшем пост, после
+# коммита.
+THUMBNAIL_PRESETS = {
+    'card': ('1920x1080', {'crop': 'center', 'upscale': True}),
+    'best': ('x369', {'crop': 'center', 'upscale': True}),
+    'detail': ('960x280', {'crop': 'center', 'upscale': True}),
+}
+THUMBNAIL_WORKERS = int(os.environ.get('YATUBE_THUMBNAIL_WORKERS', 2))
+# Адаптивные варианты превью для srcset: ширины меньше ширины пресета и
+# форматы для <source> в порядке предпочтения. Форматы, которые Pillow
+# не умеет сохранять, пропускаются.
+THUMBNAIL_SRCSET_WIDTHS = (480, 960, 1440)
+THUMBNAIL_SRCSET_FORMATS = ('AVIF', 'WEBP')
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
-
-
+# Медиафайлы отдает core.views.serve_media. За nginx укажите
+# YATUBE_MEDIA_SENDFILE=x-accel-redirect и internal-location
+# MEDIA_ACCEL_PREFIX с alias на MEDIA_ROOT, за Apache или lighttpd -
+# x-sendfile. Файлы с хешем в имени кэшируются навсегда, остальные на
+# MEDIA_MAX_AGE секунд.
+MEDIA_SENDFILE = os.environ.get('YATUBE_MEDIA_SENDFILE', '')
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+MEDIA_MAX_AGE = 60 * 60
+
+
+# Кэш общий для всех воркеров: YATUBE_CACHE=db (таблица в базе, нужен
+# manage.py createcachetable), file или memcached (нужен пакет
+# python-memcached). По умолчанию - память процесса, ее хватает для
+# разработки и тестов.
+CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', ''),
+    'db': ('django.core.cache.backends.db.DatabaseCache', 'yatube_cache'),
+    'file': (
+        'django.core.cache.backends.filebased.FileBasedCache',
+        os.path.join(BASE_DIR, 'django_cache'),
+    ),
+    'memcached': (
+        'django.core.cache.backends.memcached.MemcachedCache',
+        '127.0.0.1:11211',
+    ),
+}
+CACHE_NAME = os.environ.get('YATUBE_CACHE', 'locmem')
+if CACHE_NAME not in CACHE_BACKENDS:
+    raise ImproperlyConfigured(
+        f'YATUBE_CACHE={CACHE_NAME!r}: допустимы '
+        f'{", ".join(CACHE_BACKENDS)}.'
+    )
+CACHE_BACKEND, CACHE_LOCATION = CACHE_BACKENDS[CACHE_NAME]
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.environ.get('YATUBE_CACHE_LOCATION', CACHE_LOCATION),
     }
 }
+# Устаревший фрагмент хранится еще столько секунд после своего срока и
+# отдается, пока один воркер под блокировкой строит новый.
+STALE_CACHE_GRACE = 3600
+STALE_CACHE_LOCK_TIMEOUT = 10
+
+# Лента подписок: посты авторов, у которых подписчиков больше порога,
+# не раскладываются по лентам, а подмешиваются при чтении.
+TIMELINE_FANOUT_THRESHOLD = 10000
+TIMELINE_RECENT_POSTS = 100
+TIMELINE_PULL_AUTHORS_TTL = 600
+# Глубже этой страницы ?page=N ленты подписок не листается.
+TIMELINE_MAX_PAGE = 50
+
+# Поиск по постам: индекс FTS5 в SQLite; на других базах
+# SQLiteFTSBackend заменяется поиском подстроки posts.search.LikeBackend.
+POST_SEARCH_BACKEND = 'posts.search.SQLiteFTSBackend'
@@ -16,7 +16,8 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
-from django.conf.urls.static import static
+
+from core.views import serve_media, show_metrics
 
 handler404 = 'core.views.page_not_found'
 handler500 = 'core.views.server_error'
@@ -24,6 +25,13 @@ handler403 = 'core.views.permission_denied'
 
 urlpatterns = [
     path("admin/", admin.site.urls),
+    path("metrics/", show_metrics, name="metrics"),
+    path(
+        settings.MEDIA_URL.lstrip("/") + "<path:path>",
+        serve_media,
+        name="media",
+    ),
+    path("api/", include("api.urls", namespace="api")),
     path("about/", include("about.urls", namespace="about")),
     path("auth/", include("users.urls")),
     path("auth/", include("django.contrib.auth.urls")),
@@ -32,7 +40,4 @@ urlpatterns = [
 
 if settings.DEBUG:
     import debug_toolbar
-    urlpatterns += static(
-        settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
-    )
     urlpatterns += (path('__debug__/', include(debug_toolbar.urls)),)